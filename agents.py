@@ -1,42 +1,174 @@
 import os
 import re
 import json
-import boto3
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
+# Load .env before the local imports below, which read their settings at import time
+load_dotenv()
+
 # Disable OpenTelemetry before strands imports it – prevents ContextVar
 # token errors when the agent event loop runs inside Streamlit's thread pool.
+# Per-run spans are recorded by tracing.py instead.
 os.environ.setdefault("OTEL_SDK_DISABLED", "true")
 
 from strands import Agent, tool
+from strands.hooks import (
+    AfterModelCallEvent, AfterToolCallEvent, BeforeModelCallEvent, HookProvider, HookRegistry,
+)
+from strands.handlers.callback_handler import null_callback_handler
 from strands.models.bedrock import BedrockModel
+from strands.models.model import CacheConfig
+
+import rerank
+import tracing
+import retrieval
+from aws_clients import client_config
+from cache import CACHE_DIR, DiskCache, TTLCache, content_key
+from cv_compact import CV_TOKEN_BUDGET, compact_cv
+from cv_intake import split_profile
+from report_parser import (
+    EMPTY_MATCHES, TEXT_MATCH_FIELDS, ReportParseError, parse_json_object, parse_report, validate_report,
+)
+from stage_graph import Stage, StageGraph
+from streaming import IncrementalReportParser
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------------
+# Retrieval backend – Bedrock Knowledge Bases by default, or local corpora
+# (RETRIEVAL_BACKEND=local); see retrieval.py
+# ---------------------------------------------------------------------------
+_backend = retrieval.from_env()
+
+GRANTS_KB = "grants"
+COLLABORATORS_KB = "collaborators"
+POLICIES_KB = "policies"
+
+# The model chooses how many collaborator queries to send; searches beyond
+# the first MAX_COLLABORATOR_QUERIES are dropped, and no fan-out in this
+# module runs more than FANOUT_WORKERS threads at once
+MAX_COLLABORATOR_QUERIES = int(os.getenv("MAX_COLLABORATOR_QUERIES", 5))
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", 5))
 
-load_dotenv()
 
 # ---------------------------------------------------------------------------
-# AWS client – used inside every @tool to query Bedrock Knowledge Bases
+# Retrieval cache – in-process LRU, plus an optional SQLite tier shared by
+# every process on the host when KB_CACHE_PATH is set
 # ---------------------------------------------------------------------------
-_kb_client = boto3.client("bedrock-agent-runtime", region_name="us-east-1")
+
+# Seconds a cached retrieval stays fresh, per Knowledge Base
+_KB_CACHE_TTLS = {
+    GRANTS_KB: float(os.getenv("KB_CACHE_TTL_GRANTS", 6 * 3600)),
+    COLLABORATORS_KB: float(os.getenv("KB_CACHE_TTL_COLLABORATORS", 24 * 3600)),
+    POLICIES_KB: float(os.getenv("KB_CACHE_TTL_POLICIES", 7 * 24 * 3600)),
+}
+# Knowledge Bases queried with keyword lists, where word order carries no meaning
+_KEYWORD_KBS = {POLICIES_KB}
+
+_kb_cache = TTLCache(max_entries=int(os.getenv("KB_CACHE_MAX_ENTRIES", 512)))
+_kb_disk_cache = (
+    DiskCache(os.getenv("KB_CACHE_PATH"), max_bytes=int(os.getenv("KB_CACHE_MAX_BYTES", 32 * 1024 * 1024)))
+    if os.getenv("KB_CACHE_PATH")
+    else None
+)
+
+
+def _normalize_query(kb: str, query: str) -> str:
+    """Case-fold and collapse whitespace/punctuation so trivially different queries share a key."""
+    words = re.findall(r"[\w-]+", query.lower())
+    if kb in _KEYWORD_KBS:
+        words = sorted(set(words))
+    return " ".join(words)
+
+
+def kb_cache_stats() -> dict:
+    """Hit/miss counters for the retrieval cache tiers and the pipeline stage memo."""
+    stats = {"memory": _kb_cache.stats.as_dict()}
+    if _kb_disk_cache is not None:
+        stats["disk"] = _kb_disk_cache.stats.as_dict()
+    stats["stages"] = _PIPELINE_GRAPH.stats.as_dict()
+    return stats
 
 
 # ---------------------------------------------------------------------------
 # Tool helpers
 # ---------------------------------------------------------------------------
 
-def _retrieve(kb_id: str, query: str, n: int = 5) -> str:
-    """Run a Knowledge Base retrieve call and return formatted text."""
-    response = _kb_client.retrieve(
-        knowledgeBaseId=kb_id,
-        retrievalQuery={"text": query},
-        retrievalConfiguration={"vectorSearchConfiguration": {"numberOfResults": n}},
-    )
-    results = response.get("retrievalResults", [])
-    if not results:
-        return "No results found."
-    return "\n\n".join(
-        f"Result {i}:\n{r.get('content', {}).get('text', '')}"
-        for i, r in enumerate(results, 1)
-    )
+def _retrieve(kb: str, query: str, n: int = 5, token_budget: int = rerank.TOOL_TOKEN_BUDGET) -> str:
+    """Query a Knowledge Base and return formatted, reranked text, served from cache when fresh."""
+    chunks, stats = _retrieve_ranked(kb, query, n, token_budget)
+    return _format_chunks(chunks, stats["duplicates_dropped"])
+
+
+def _format_chunks(chunks: list[str], duplicates: int = 0) -> str:
+    body = "\n\n".join(f"Result {i}:\n{text}" for i, text in enumerate(chunks, 1))
+    if duplicates:
+        note = f"({duplicates} result(s) already returned earlier in this run omitted.)"
+        body = f"{body}\n\n{note}" if body else note
+    return body or "No results found."
+
+
+def _retrieve_ranked(kb: str, query: str, n: int = 5,
+                     token_budget: int = rerank.TOOL_TOKEN_BUDGET) -> tuple[list[str], dict]:
+    """
+    Over-fetch RERANK_FETCH candidates and keep the best `n` after local
+    reranking, cross-call deduplication and the per-result token budget.
+    """
+    return _select_chunks(kb, _retrieve_candidates(kb, query, n), n, token_budget)
+
+
+def _retrieve_candidates(kb: str, query: str, n: int = 5) -> list[str]:
+    """Over-fetched candidates for `query`, reranked but not yet deduplicated or budgeted."""
+    fetch = max(n, rerank.RERANK_FETCH) if rerank.RERANK_ENABLED else n
+    candidates = _retrieve_chunks(kb, query, fetch)
+    with tracing.span(kb, "rerank", candidates=len(candidates)):
+        return rerank.rank(query, candidates)
+
+
+def _select_chunks(kb: str, ranked: list[str], n: int = 5,
+                   token_budget: int = rerank.TOOL_TOKEN_BUDGET) -> tuple[list[str], dict]:
+    """Deduplicate `ranked` against this run's earlier results and apply the token budget."""
+    with tracing.span(kb, "select") as span:
+        chunks, stats = rerank.select(ranked, n, token_budget)
+        span.attrs.update(stats)
+    return chunks, stats
+
+
+def _retrieve_chunks(kb: str, query: str, n: int = 5) -> list[str]:
+    """Return the text of each retrieved chunk, best first, served from cache when fresh."""
+    with tracing.span(kb, "retrieve", n=n, query_chars=len(query), backend=_backend.name) as span:
+        chunks, span.attrs["cache"] = _lookup_chunks(kb, query, n)
+        span.attrs["chunks"] = len(chunks)
+        span.attrs["result_chars"] = sum(len(c) for c in chunks)
+    return chunks
+
+
+def _lookup_chunks(kb: str, query: str, n: int) -> tuple[list[str], str]:
+    """Return (chunks, tier) where tier is "memory", "disk" or "miss"."""
+    key = content_key(_backend.name, kb, _normalize_query(kb, query), n)
+    cached = _kb_cache.get(key)
+    if cached is not None:
+        return cached, "memory"
+    ttl = _KB_CACHE_TTLS.get(kb)
+    if _kb_disk_cache is not None:
+        stored = _kb_disk_cache.get(key)
+        if stored is not None:
+            chunks = json.loads(stored)
+            _kb_cache.set(key, chunks, ttl=ttl)
+            return chunks, "disk"
+
+    started = time.perf_counter()
+    chunks = _backend.retrieve(kb, query, n)
+    cost = time.perf_counter() - started
+    _kb_cache.set(key, chunks, ttl=ttl, cost=cost)
+    if _kb_disk_cache is not None:
+        _kb_disk_cache.set(key, json.dumps(chunks).encode("utf-8"), cost=cost, ttl=ttl)
+    return chunks, "miss"
 
 
 # ---------------------------------------------------------------------------
@@ -47,27 +179,43 @@ def _retrieve(kb_id: str, query: str, n: int = 5) -> str:
 def search_grant_opportunities(researcher_strengths: str) -> str:
     """Search the grant opportunities Knowledge Base. Returns the top 5 grant opportunities matching the researcher's strengths. Call this once to discover all candidate grants."""
     try:
-        return "GRANT OPPORTUNITIES FOUND:\n\n" + _retrieve("KFW7ZEBGMR", researcher_strengths)
+        return "GRANT OPPORTUNITIES FOUND:\n\n" + _retrieve(GRANTS_KB, researcher_strengths)
     except Exception as e:
         return f"Error searching grant opportunities: {str(e)}"
 
 
 @tool
-def search_complementary_collaborators(researcher_profile_and_specific_grant_requirements: str) -> str:
-    """Search the collaborators Knowledge Base. Call this once per grant (3 total calls) with the researcher profile combined with that specific grant's requirements to find the best-fit collaborator for each grant."""
-    try:
-        return "COMPLEMENTARY COLLABORATORS FOUND:\n\n" + _retrieve(
-            "Q89ZCWQSRY", researcher_profile_and_specific_grant_requirements
+def search_collaborators_for_grants(grant_specific_queries: list[str]) -> str:
+    """Search the collaborators Knowledge Base for every selected grant in one call. Pass a list of 3 queries, one per grant, each combining the researcher profile with that grant's specific requirements. Returns the candidate collaborators grouped by grant, in the same order as the queries."""
+    if not grant_specific_queries:
+        return "Error searching collaborators: no queries provided."
+    queries = grant_specific_queries[:MAX_COLLABORATOR_QUERIES]
+    budget = rerank.TOOL_TOKEN_BUDGET // len(queries)
+    fetch = tracing.bind(_retrieve_candidates)
+    with ThreadPoolExecutor(max_workers=min(len(queries), FANOUT_WORKERS)) as pool:
+        futures = [pool.submit(fetch, COLLABORATORS_KB, q) for q in queries]
+    # Retrieve concurrently, deduplicate in query order: the same chunks every run
+    sections = []
+    for i, future in enumerate(futures, 1):
+        try:
+            chunks, stats = _select_chunks(COLLABORATORS_KB, future.result(), 5, budget)
+            text = _format_chunks(chunks, stats["duplicates_dropped"])
+        except Exception as e:
+            text = f"Error searching collaborators: {str(e)}"
+        sections.append(f"=== Grant {i} ===\n{text}")
+    if len(grant_specific_queries) > len(queries):
+        sections.append(
+            f"(Only the first {len(queries)} of {len(grant_specific_queries)} queries were searched; "
+            f"send at most {MAX_COLLABORATOR_QUERIES}.)"
         )
-    except Exception as e:
-        return f"Error searching collaborators: {str(e)}"
+    return "COMPLEMENTARY COLLABORATORS FOUND:\n\n" + "\n\n".join(sections)
 
 
 @tool
 def search_institutional_policies(grant_and_proposal_keywords: str) -> str:
     """Search the institutional policies Knowledge Base for submission guidelines and compliance requirements relevant to the grant proposals."""
     try:
-        return "INSTITUTIONAL POLICIES & GUIDELINES:\n\n" + _retrieve("LULFPOFCTD", grant_and_proposal_keywords)
+        return "INSTITUTIONAL POLICIES & GUIDELINES:\n\n" + _retrieve(POLICIES_KB, grant_and_proposal_keywords)
     except Exception as e:
         return f"Error searching institutional policies: {str(e)}"
 
@@ -76,121 +224,945 @@ def search_institutional_policies(grant_and_proposal_keywords: str) -> str:
 # System prompt
 # ---------------------------------------------------------------------------
 
+_OUTPUT_SPEC = """CRITICAL OUTPUT RULE:
+Your entire response must be a single valid JSON object — no preamble, no explanation, no markdown fences.
+Start your response with { and end with }.
+
+Required JSON schema (EXACTLY 3 objects in the matches array):
+{
+  "researcher_summary": "Markdown bullet list of the researcher's top 5-7 key strengths and expertise areas. Use - for bullets.",
+  "matches": [
+    {
+      "grant_title": "Full official name of the grant",
+      "grant_agency": "Funding agency name (e.g. NSF, NIH, DOE)",
+      "grant_match_score": 88,
+      "grant_justification": "2-3 sentences explaining exactly why this grant aligns with the researcher's profile and expertise.",
+      "collaborator_name": "Full name and title of the recommended collaborator (e.g. Dr. Jane Smith)",
+      "collaborator_department": "Department and institution of the collaborator",
+      "collaborator_synergy_score": 95,
+      "collaborator_justification": "2-3 sentences on how this collaborator's skills complement the researcher and fill gaps required by this specific grant.",
+      "draft_proposal": "A compelling ~200-word abstract for the joint grant proposal. Must reference both researchers and how they address the grant objectives.",
+      "draft_email": "A professional outreach email. Format: 'Subject: [subject line]\\n\\nDear [Name],\\n\\n[~150 word body]\\n\\nBest regards,\\n[Researcher Name]'"
+    }
+  ]
+}
+
+Additional rules:
+- All score fields must be plain integers 0-100 (no decimals, no % symbol in JSON)
+- Scores should reflect genuine fit: grant_match_score for CV-to-grant alignment, collaborator_synergy_score for skill complementarity
+- Use different collaborators for each of the 3 grants where possible
+- All text must be in English
+- Ensure the JSON is syntactically valid: escape internal quotes, no trailing commas"""
+
 SYSTEM_PROMPT = """You are FundingForge, an expert academic grant matchmaking agent.
 
 EXECUTION STEPS — follow in this exact order:
 1. Analyze the CV to extract the researcher's top strengths, expertise areas, and notable achievements.
 2. Call search_grant_opportunities once with a concise description of the researcher's strengths to get candidate grants.
 3. Select the TOP 3 most relevant grants from the results.
-4. Call search_complementary_collaborators THREE TIMES — once per grant — using the researcher profile combined with each specific grant's requirements. Find a distinct collaborator for each.
+4. Call search_collaborators_for_grants ONCE with a list of 3 queries — one per selected grant, in the same order — each combining the researcher profile with that grant's specific requirements. Pick a distinct collaborator for each grant from its group of results.
 5. Call search_institutional_policies once with keywords from the grant types to retrieve submission guidelines.
 6. Synthesize all findings and output ONLY the JSON object below.
 
+""" + _OUTPUT_SPEC
+
+# Used by run_pipeline, where retrieval happens in code before the single model call
+PIPELINE_SYSTEM_PROMPT = """You are FundingForge, an expert academic grant matchmaking agent.
+
+All Knowledge Base retrieval has already been done for you. The user message contains the researcher's CV
+followed by the retrieved candidate grants, candidate collaborators grouped by grant, and institutional policies.
+1. Analyze the CV to extract the researcher's top strengths, expertise areas, and notable achievements.
+2. Select the TOP 3 most relevant grants from the candidate grants.
+3. For each selected grant, pick a distinct best-fit collaborator, preferring the group retrieved for that grant.
+4. Use the institutional policies to inform the proposals, then output ONLY the JSON object below.
+
+""" + _OUTPUT_SPEC
+
+# Used by run_parallel: one short call picks and scores the matches ...
+SELECT_SYSTEM_PROMPT = """You are FundingForge, an expert academic grant matchmaking agent.
+
+All Knowledge Base retrieval has already been done for you. The user message contains the researcher's CV
+followed by the retrieved candidate grants, candidate collaborators grouped by grant, and institutional policies.
+1. Analyze the CV to extract the researcher's top strengths, expertise areas, and notable achievements.
+2. Select the TOP 3 most relevant grants from the candidate grants.
+3. For each selected grant, pick a distinct best-fit collaborator, preferring the group retrieved for that grant.
+Proposals and emails are written separately, so output ONLY the JSON object below.
+
 CRITICAL OUTPUT RULE:
 Your entire response must be a single valid JSON object — no preamble, no explanation, no markdown fences.
-Start your response with { and end with }.
 
 Required JSON schema (EXACTLY 3 objects in the matches array):
 {
   "researcher_summary": "Markdown bullet list of the researcher's top 5-7 key strengths and expertise areas. Use - for bullets.",
   "matches": [
     {
+      "grant_result": 2,
       "grant_title": "Full official name of the grant",
       "grant_agency": "Funding agency name (e.g. NSF, NIH, DOE)",
       "grant_match_score": 88,
-      "grant_justification": "2-3 sentences explaining exactly why this grant aligns with the researcher's profile and expertise.",
       "collaborator_name": "Full name and title of the recommended collaborator (e.g. Dr. Jane Smith)",
       "collaborator_department": "Department and institution of the collaborator",
-      "collaborator_synergy_score": 95,
-      "collaborator_justification": "2-3 sentences on how this collaborator's skills complement the researcher and fill gaps required by this specific grant.",
-      "draft_proposal": "A compelling ~200-word abstract for the joint grant proposal. Must reference both researchers and how they address the grant objectives.",
-      "draft_email": "A professional outreach email. Format: 'Subject: [subject line]\\n\\nDear [Name],\\n\\n[~150 word body]\\n\\nBest regards,\\n[Researcher Name]'"
+      "collaborator_synergy_score": 95
     }
   ]
 }
 
 Additional rules:
+- grant_result is the N of the grant's "Result N" entry under CANDIDATE GRANTS
 - All score fields must be plain integers 0-100 (no decimals, no % symbol in JSON)
 - Scores should reflect genuine fit: grant_match_score for CV-to-grant alignment, collaborator_synergy_score for skill complementarity
-- Use different collaborators for each of the 3 grants where possible
+- All text must be in English"""
+
+# ... then one call per match writes its justifications, proposal and email, concurrently
+DRAFT_SYSTEM_PROMPT = """You are FundingForge, an expert academic grant writer.
+
+The user message contains a researcher's CV, one selected grant and collaborator, the retrieved text about
+them, and institutional policies. Write the application materials for this one match.
+
+CRITICAL OUTPUT RULE:
+Your entire response must be a single valid JSON object — no preamble, no explanation, no markdown fences.
+
+Required JSON schema:
+{
+  "grant_justification": "2-3 sentences explaining exactly why this grant aligns with the researcher's profile and expertise.",
+  "collaborator_justification": "2-3 sentences on how this collaborator's skills complement the researcher and fill gaps required by this specific grant.",
+  "draft_proposal": "A compelling ~200-word abstract for the joint grant proposal. Must reference both researchers and how they address the grant objectives.",
+  "draft_email": "A professional outreach email. Format: 'Subject: [subject line]\\n\\nDear [Name],\\n\\n[~150 word body]\\n\\nBest regards,\\n[Researcher Name]'"
+}
+
+Additional rules:
+- Follow the institutional policies where they apply to this grant
 - All text must be in English
 - Ensure the JSON is syntactically valid: escape internal quotes, no trailing commas"""
 
+# Used for the one follow-up call made when a report cannot be parsed or repaired locally
+REPAIR_SYSTEM_PROMPT = """You repair malformed JSON reports written by FundingForge.
+The user message lists the problems a parser found, then the broken report. Return the same report as a
+single valid JSON object matching the schema below. Keep every field's content as written; do not add,
+remove or reorder matches except to drop a final match that was cut off before its required fields.
+
+""" + _OUTPUT_SPEC
+
 
 # ---------------------------------------------------------------------------
 # Public entry point
 # ---------------------------------------------------------------------------
 
-def run_agent(cv_text: str, callback=None) -> dict:
-    """
-    Run the FundingForge agent on the provided CV text.
+MODEL_ID = os.getenv("MODEL_ID", "us.anthropic.claude-sonnet-4-5-20250929-v1:0")
+FAST_MODEL_ID = os.getenv("FAST_MODEL_ID", "us.anthropic.claude-haiku-4-5-20251001-v1:0")
+MODEL_REGION = "us-east-1"
 
-    Args:
-        cv_text:  Extracted plain-text content of the uploaded CV.
-        callback: Optional Strands callback_handler for streaming events.
+# Model per stage, each overridable with MODEL_<STAGE> (e.g. MODEL_PLAN=...):
+#   plan       agent-mode turns that pick tools and write the search queries
+#   synthesis  the call that writes the whole JSON report (agent and pipeline modes)
+#   select     parallel mode's researcher summary and match selection
+#   draft      parallel mode's per-match justifications, proposal and email
+#   repair     the follow-up call that fixes unparseable JSON
+_STAGE_DEFAULTS = {
+    "plan": FAST_MODEL_ID,
+    "synthesis": MODEL_ID,
+    "select": FAST_MODEL_ID,
+    "draft": MODEL_ID,
+    "repair": FAST_MODEL_ID,
+}
+STAGE_MODELS = {stage: os.getenv(f"MODEL_{stage.upper()}", default) for stage, default in _STAGE_DEFAULTS.items()}
 
-    Returns:
-        Parsed dict with 'researcher_summary', 'matches' list, and '_raw'.
-    """
-    model = BedrockModel(
-        model_id="us.anthropic.claude-sonnet-4-5-20250929-v1:0",
-        region_name="us-east-1",
-    )
+# Bedrock prompt caching: checkpoints after the tool specs, the system prompt,
+# the CV block and (each agent turn) the conversation so far. Cached prefixes
+# live PROMPT_CACHE_TTL ("5m" or "1h"; Bedrock's default when unset). Caches
+# are per model: every model client carries its own checkpoints, so each stage
+# reads back the prefixes its own model wrote (plan turns from earlier plan
+# turns, synthesis from earlier runs of the same CV). Results report the hit
+# ratio per stage.
+PROMPT_CACHE = os.getenv("PROMPT_CACHE", "1") != "0"
+PROMPT_CACHE_TTL = os.getenv("PROMPT_CACHE_TTL") or None
 
-    agent_kwargs = dict(
-        model=model,
+# "agent" lets the model drive retrieval via tools; "pipeline" retrieves in code first;
+# "parallel" retrieves in code, then writes each match in its own concurrent model call
+MODES = ("agent", "pipeline", "parallel")
+DEFAULT_MODE = os.getenv("FUNDINGFORGE_MODE", "agent")
+
+
+# ---------------------------------------------------------------------------
+# Model / agent pool – model clients (boto3 session, credentials, connection
+# pool) are built once per process; each run gets a fresh Agent, and so a
+# fresh conversation, from a prebuilt template.
+# ---------------------------------------------------------------------------
+
+_model_pool: dict[tuple[str, str], BedrockModel] = {}
+_model_pool_lock = threading.Lock()
+
+# `stage` picks the model from STAGE_MODELS; the agent template switches to
+# `final_stage` once every one of its tools has returned a result
+_AGENT_TEMPLATES = {
+    "agent": dict(
         system_prompt=SYSTEM_PROMPT,
-        tools=[
+        tools=(
             search_grant_opportunities,
-            search_complementary_collaborators,
+            search_collaborators_for_grants,
             search_institutional_policies,
-        ],
+        ),
+        stage="plan",
+        final_stage="synthesis",
+    ),
+    "pipeline": dict(system_prompt=PIPELINE_SYSTEM_PROMPT, tools=(), stage="synthesis"),
+    "select": dict(system_prompt=SELECT_SYSTEM_PROMPT, tools=(), stage="select"),
+    "draft": dict(system_prompt=DRAFT_SYSTEM_PROMPT, tools=(), stage="draft"),
+    "repair": dict(system_prompt=REPAIR_SYSTEM_PROMPT, tools=(), stage="repair"),
+}
+
+
+def _get_model(model_id: str = MODEL_ID, region: str = MODEL_REGION) -> BedrockModel:
+    """Return the process-wide BedrockModel for (model_id, region), creating it on first use."""
+    key = (model_id, region)
+    with _model_pool_lock:
+        model = _model_pool.get(key)
+        if model is None:
+            model = BedrockModel(
+                model_id=model_id,
+                region_name=region,
+                boto_client_config=client_config("bedrock-runtime"),
+                **({"cache_config": CacheConfig(ttl=PROMPT_CACHE_TTL, tools_ttl=True)} if PROMPT_CACHE else {}),
+            )
+            _model_pool[key] = model
+    return model
+
+
+class _StageRouting(HookProvider):
+    """
+    Point every model call at its stage's model. Strands reads `agent.model`
+    after BeforeModelCallEvent hooks, so the model can change between turns
+    of one conversation: with a `final_stage`, turns run on `stage` (which
+    picks the tools and writes the search queries) until every one of the
+    agent's tools has returned a result, and the report-writing turn after
+    that runs on `final_stage`. A run whose model answers without calling
+    every tool writes its report on `stage`; that fallback is logged and
+    recorded as the trace's `routing_fallback` attribute.
+    """
+
+    def __init__(self, stage: str, final_stage: str | None = None):
+        self.stage = stage
+        self.final_stage = final_stage
+
+    def register_hooks(self, registry: HookRegistry, **kwargs) -> None:
+        registry.add_callback(BeforeModelCallEvent, self._before_model)
+        registry.add_callback(AfterModelCallEvent, self._after_model)
+
+    def _before_model(self, event: BeforeModelCallEvent) -> None:
+        stage = self.stage
+        if self.final_stage is not None and _tools_with_results(event.agent.messages) >= set(event.agent.tool_names):
+            stage = self.final_stage
+        event.agent.model = _get_model(STAGE_MODELS[stage])
+        event.invocation_state["_model_stage"] = stage
+
+    def _after_model(self, event: AfterModelCallEvent) -> None:
+        if (
+            self.final_stage is None
+            or event.stop_response is None
+            or event.stop_response.stop_reason == "tool_use"
+            or event.invocation_state.get("_model_stage") != self.stage
+        ):
+            return
+        logger.info("Final answer written on the %r stage: not every tool was called", self.stage)
+        trace = tracing.current_trace()
+        if trace is not None:
+            trace.attrs["routing_fallback"] = self.stage
+
+
+def _tools_with_results(messages: list[dict]) -> set[str]:
+    """Names of the tools whose calls in `messages` have a result."""
+    names = {
+        block["toolUse"]["toolUseId"]: block["toolUse"]["name"]
+        for message in messages
+        for block in message.get("content", [])
+        if "toolUse" in block
+    }
+    return {
+        names[block["toolResult"]["toolUseId"]]
+        for message in messages
+        for block in message.get("content", [])
+        if "toolResult" in block and block["toolResult"].get("toolUseId") in names
+    }
+
+
+class _TraceHooks(HookProvider):
+    """Record a span per model turn (named after its stage) and per tool call on the current trace."""
+
+    def register_hooks(self, registry: HookRegistry, **kwargs) -> None:
+        registry.add_callback(BeforeModelCallEvent, self._before_model)
+        registry.add_callback(AfterModelCallEvent, self._after_model)
+        registry.add_callback(AfterToolCallEvent, self._after_tool)
+
+    def _before_model(self, event: BeforeModelCallEvent) -> None:
+        event.invocation_state["_trace_model_started"] = time.perf_counter()
+
+    def _after_model(self, event: AfterModelCallEvent) -> None:
+        trace = tracing.current_trace()
+        started = event.invocation_state.pop("_trace_model_started", None)
+        if trace is None or started is None:
+            return
+        attrs = {
+            "turn": sum(1 for s in trace.spans if s.kind == "model") + 1,
+            "model_id": event.agent.model.get_config().get("model_id"),
+        }
+        if event.exception is not None:
+            attrs["error"] = type(event.exception).__name__
+        elif event.stop_response is not None:
+            message = event.stop_response.message
+            metadata = message.get("metadata", {})
+            usage, metrics = metadata.get("usage", {}), metadata.get("metrics", {})
+            attrs.update(
+                stop_reason=event.stop_response.stop_reason,
+                input_tokens=usage.get("inputTokens", 0),
+                output_tokens=usage.get("outputTokens", 0),
+                cache_read_tokens=usage.get("cacheReadInputTokens", 0),
+                cache_write_tokens=usage.get("cacheWriteInputTokens", 0),
+                server_latency_ms=metrics.get("latencyMs"),
+                output_chars=sum(len(block.get("text", "")) for block in message.get("content", [])),
+            )
+        trace.record(event.invocation_state.get("_model_stage", "model"), "model", started, **attrs)
+
+    def _after_tool(self, event: AfterToolCallEvent) -> None:
+        trace = tracing.current_trace()
+        if trace is None:
+            return
+        result = event.result or {}
+        attrs = {
+            "input_chars": len(json.dumps(event.tool_use.get("input", {}), default=str)),
+            "output_chars": sum(len(block.get("text", "")) for block in result.get("content", [])),
+            "status": result.get("status"),
+        }
+        if event.exception is not None:
+            attrs["error"] = type(event.exception).__name__
+        duration = event.duration or 0.0
+        trace.record(event.tool_use.get("name", "tool"), "tool", time.perf_counter() - duration, **attrs)
+
+
+_trace_hooks = _TraceHooks()
+
+
+def _new_agent(template: str, callback=None) -> Agent:
+    """Build an Agent with empty conversation state on a pooled model client."""
+    spec = _AGENT_TEMPLATES[template]
+    routing = _StageRouting(spec["stage"], spec.get("final_stage"))
+    agent_kwargs = dict(
+        model=_get_model(STAGE_MODELS[spec["stage"]]),
+        system_prompt=spec["system_prompt"],
+        tools=list(spec["tools"]),
+        hooks=[routing, _trace_hooks],
+        retry_strategy=None,  # throttles are retried once, by botocore's adaptive mode (aws_clients.py)
     )
     if callback is not None:
         agent_kwargs["callback_handler"] = callback
+    return Agent(**agent_kwargs)
 
-    agent = Agent(**agent_kwargs)
 
-    prompt = (
+def warm_up(probe: bool = True) -> None:
+    """
+    Pre-build pooled model clients so the first request skips boto3 session,
+    credential and endpoint setup. With `probe`, also warm the retrieval
+    backend (a one-result Bedrock KB retrieve opens a kept-alive TLS
+    connection; the local backend loads its indexes).
+    Safe to call from a background thread; failures are logged, not raised.
+    """
+    started = time.perf_counter()
+    try:
+        for model_id in set(STAGE_MODELS.values()):
+            _get_model(model_id)
+        if probe:
+            _backend.warm_up()
+    except Exception:
+        logger.warning("FundingForge warm-up failed", exc_info=True)
+        return
+    logger.info("FundingForge warm-up finished in %.2fs", time.perf_counter() - started)
+
+
+# ---------------------------------------------------------------------------
+# Result cache – finished reports keyed by the enriched CV plus everything
+# that shapes the output, shared by all sessions and processes on the host
+# ---------------------------------------------------------------------------
+
+# Changes whenever a prompt is edited, invalidating reports written under the old one
+PROMPT_VERSION = content_key(
+    SYSTEM_PROMPT, PIPELINE_SYSTEM_PROMPT, SELECT_SYSTEM_PROMPT, DRAFT_SYSTEM_PROMPT, REPAIR_SYSTEM_PROMPT,
+)[:12]
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", 7 * 24 * 3600))
+
+_result_cache = DiskCache(
+    os.getenv("RESULT_CACHE_PATH") or os.path.join(CACHE_DIR, "results.sqlite"),
+    max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+)
+
+
+def _result_key(cv_text: str, mode: str) -> str:
+    return content_key("report", sorted(STAGE_MODELS.items()), PROMPT_VERSION, mode, CV_TOKEN_BUDGET, cv_text)
+
+
+def get_cached_result(cv_text: str, mode: str | None = None) -> dict | None:
+    """Return the stored report for this enriched CV, or None if absent or expired."""
+    stored = _result_cache.get(_result_key(cv_text, mode or DEFAULT_MODE))
+    if stored is None:
+        return None
+    result = json.loads(stored)
+    result["_cache_hit"] = True
+    return result
+
+
+def run_agent(cv_text: str, callback=None, mode: str | None = None, force_refresh: bool = False) -> dict:
+    """
+    Run the FundingForge agent on the provided CV text.
+
+    Args:
+        cv_text:       Extracted plain-text content of the uploaded CV.
+        callback:      Optional Strands callback_handler for streaming events.
+        mode:          "agent" (model-driven tool loop), "pipeline" (see
+                       run_pipeline) or "parallel" (see run_parallel).
+                       Defaults to FUNDINGFORGE_MODE, else "agent".
+        force_refresh: Ignore any cached report and run the agent again.
+
+    Returns:
+        Parsed dict with 'researcher_summary', 'matches' list, '_raw',
+        '_compaction' (how much of the CV was trimmed to fit CV_TOKEN_BUDGET),
+        '_repairs' (what had to be fixed to parse the report, when anything did),
+        '_trace' (per-stage spans with durations, sizes, token usage and
+        cache hits; see tracing.py), '_prompt_cache' (Bedrock prompt-cache
+        read/write tokens and hit ratio per stage) and '_rerank' (retrieved-context tokens saved by
+        reranking, deduplication and TOOL_TOKEN_BUDGET). Reports served from
+        the result cache carry '_cache_hit': True instead of '_prompt_cache'.
+    """
+    mode = mode or DEFAULT_MODE
+    if mode not in MODES:
+        raise ValueError(f"Unknown run mode: {mode!r}")
+
+    with tracing.start_trace("run_agent", mode=mode) as trace, rerank.start_run() as context_stats:
+        result = _run_traced(cv_text, callback, mode, force_refresh)
+    result["_trace"] = trace.as_dict()
+    if not result.get("_cache_hit"):
+        result["_prompt_cache"] = _prompt_cache_stats(result["_trace"]["totals"])
+    if context_stats.calls:
+        result["_rerank"] = context_stats.as_dict()
+    return result
+
+
+def _prompt_cache_stats(totals: dict) -> dict:
+    """
+    Prompt-cache token counts for one run; hit_ratio is the share of prompt
+    tokens read from cache, overall and per model stage.
+    """
+    def hit_ratio(tokens: dict) -> float:
+        prompt = tokens["input_tokens"] + tokens["cache_read_tokens"] + tokens["cache_write_tokens"]
+        return round(tokens["cache_read_tokens"] / prompt, 3) if prompt else 0.0
+
+    tokens = totals["tokens"]
+    return {
+        "read_tokens": tokens["cache_read_tokens"],
+        "write_tokens": tokens["cache_write_tokens"],
+        "uncached_tokens": tokens["input_tokens"],
+        "hit_ratio": hit_ratio(tokens),
+        "by_stage": {stage: hit_ratio(agg) for stage, agg in totals["models"].items()},
+    }
+
+
+def _run_traced(cv_text: str, callback, mode: str, force_refresh: bool) -> dict:
+    if not force_refresh:
+        with tracing.span("result_cache", "stage") as span:
+            cached = get_cached_result(cv_text, mode)
+            span.attrs["cache"] = "miss" if cached is None else "disk"
+        if cached is not None:
+            return cached
+
+    started = time.perf_counter()
+    with tracing.span("compact_cv", "stage", input_chars=len(cv_text)) as span:
+        compaction = compact_cv(cv_text)
+        span.attrs["output_chars"] = len(compaction.text)
+    if mode == "pipeline":
+        result = run_pipeline(compaction.text, callback=callback)
+    elif mode == "parallel":
+        result = run_parallel(compaction.text, callback=callback)
+    else:
+        result = _run_agent_loop(compaction.text, callback=callback)
+    result["_compaction"] = compaction.as_dict()
+
+    if not result.get("_parse_error") and not result.get("_incomplete") and result.get("matches"):
+        _result_cache.set(
+            _result_key(cv_text, mode),
+            json.dumps(result).encode("utf-8"),
+            cost=time.perf_counter() - started,
+            ttl=RESULT_CACHE_TTL,
+        )
+    return result
+
+
+def _cv_prompt(instruction: str, cv_text: str, tail: str | None = None) -> list[dict]:
+    """
+    User message of `instruction`, the CV, then the intake profile and
+    `tail`. With prompt caching on, a checkpoint closes the CV block, so
+    calls that differ only in what follows it (another stage's tail, or an
+    edited profile on a re-run) reuse the cached system prompt + CV prefix.
+    """
+    profile, cv = split_profile(cv_text)
+    blocks = [{"text": f"{instruction}\n\n--- CV START ---\n{cv}\n--- CV END ---"}]
+    rest = "\n\n".join(part for part in (profile, tail) if part)
+    if rest:
+        if PROMPT_CACHE:
+            blocks.append({"cachePoint": {"type": "default"}})
+        blocks.append({"text": rest})
+    return blocks
+
+
+def _run_agent_loop(cv_text: str, callback=None) -> dict:
+    agent = _new_agent("agent", callback)
+
+    prompt = _cv_prompt(
         "Analyze this researcher's CV and produce the FundingForge JSON report. "
-        "Remember: output ONLY the JSON object, nothing else.\n\n"
-        f"--- CV START ---\n{cv_text}\n--- CV END ---"
+        "Remember: output ONLY the JSON object, nothing else.",
+        cv_text,
     )
     response = agent(prompt)
-    return _parse_output(str(response))
+    return _traced_parse(str(response))
+
+
+def _traced_parse(text: str, text_fields: tuple[str, ...] = TEXT_MATCH_FIELDS) -> dict:
+    with tracing.span("parse_output", "parse", input_chars=len(text)) as span:
+        result = _parse_output(text, text_fields)
+        span.attrs["parse_error"] = bool(result.get("_parse_error"))
+        span.attrs["repairs"] = len(result.get("_repairs", ()))
+    # An empty match list is valid JSON the repair prompt may not fill in
+    if (result.get("_parse_error") and JSON_REPAIR_CALL and text.strip()
+            and EMPTY_MATCHES not in result["_parse_issues"]):
+        result = _repair_with_model(text, result, text_fields)
+    return result
 
 
 # ---------------------------------------------------------------------------
-# Output parser
+# Deterministic pipeline mode
+# ---------------------------------------------------------------------------
+
+_STOPWORDS = set("""
+about above after again against also among and another any are around based been before being below
+between both but can could department did does doing during each early from further have having here
+into its journal just more most non other over own pp proceedings same should some such than that the
+their them then there these they this those through under university until very vol was were what when
+where which while who whom why will with within would year years your using used use new via
+""".split())
+
+
+def _intake_interests(cv_text: str) -> str:
+    """The research interests stated on the intake form, or "" when none were given."""
+    interests = re.search(r"Stated Research Interests:\s*(.+)", cv_text)
+    if interests and interests.group(1).strip() != "Not provided":
+        return interests.group(1).strip()
+    return ""
+
+
+def _extract_expertise(cv_text: str, max_terms: int = 25) -> str:
+    """The most frequent content words of the CV itself, without the intake profile."""
+    counts: dict[str, int] = {}
+    for word in re.findall(r"[a-z][a-z-]{3,}", split_profile(cv_text)[1].lower()):
+        if word not in _STOPWORDS:
+            counts[word] = counts.get(word, 0) + 1
+    terms = sorted(counts, key=counts.get, reverse=True)[:max_terms]
+    return "Expertise: " + ", ".join(terms) if terms else ""
+
+
+def _join_strengths(interests: str, expertise: str) -> str:
+    """The grant search query: stated interests, then CV expertise."""
+    return ". ".join(part for part in (interests, expertise) if part)[:900]
+
+
+def _notify(callback, tool_name: str) -> None:
+    """Emit a Strands-style tool-use event so progress UIs work in both modes."""
+    if callback is not None:
+        callback(current_tool_use={"name": tool_name})
+
+
+def _format_section(title: str, ranked: tuple[list[str], dict]) -> str:
+    chunks, stats = ranked
+    return f"{title}\n\n{_format_chunks(chunks, stats['duplicates_dropped'])}"
+
+
+def run_pipeline(cv_text: str, callback=None) -> dict:
+    """
+    Run FundingForge with retrieval done in code and a single model call.
+
+    Strengths are extracted locally, grants are retrieved, then the three
+    grant-specific collaborator searches and the policy search run in
+    parallel. The model sees everything at once and writes the same JSON
+    report as the agent loop.
+    """
+    context = _pipeline_context(*_pipeline_retrieval(cv_text, callback))
+
+    agent = _new_agent("pipeline", callback)
+
+    prompt = _cv_prompt(
+        "Analyze this researcher's CV and the retrieved context, then produce the FundingForge JSON report. "
+        "Remember: output ONLY the JSON object, nothing else.",
+        cv_text,
+        f"--- RETRIEVED CONTEXT START ---\n{context}\n--- RETRIEVED CONTEXT END ---",
+    )
+    response = agent(prompt)
+    return _traced_parse(str(response))
+
+
+def _pipeline_retrieval(cv_text: str, callback=None) -> tuple[tuple, list[tuple], tuple]:
+    """Ranked (chunks, stats) for the grants, each top grant's collaborators, and the policies."""
+    def on_start(stage: str) -> None:
+        if stage in _STAGE_TOOLS:
+            _notify(callback, _STAGE_TOOLS[stage])
+
+    out = _PIPELINE_GRAPH.run(
+        {"cv_text": cv_text}, ("grants", "collaborator_candidates", "policy_candidates"), on_start,
+    )
+    # Deduplicate against this run's earlier results in a fixed order, after the fan-out
+    budget = rerank.TOOL_TOKEN_BUDGET // max(1, len(out["collaborator_candidates"]))
+    collaborators = [
+        _select_chunks(COLLABORATORS_KB, ranked, 5, budget) for ranked in out["collaborator_candidates"]
+    ]
+    policies = _select_chunks(POLICIES_KB, out["policy_candidates"])
+    return out["grants"], collaborators, policies
+
+
+def _top_grants(grants: tuple[list[str], dict]) -> tuple[str, ...]:
+    return tuple(grants[0][:3])
+
+
+def _collaborator_candidates(expertise: str, top_grants: tuple[str, ...]) -> list[list[str]]:
+    """
+    Ranked collaborator candidates for each top grant, retrieved in parallel.
+    The queries leave out the stated interests, so a grant that stays on
+    top after an interests edit hits the retrieval cache.
+    """
+    if not top_grants:
+        return []
+    queries = [f"{expertise}\n\nGrant requirements: {g[:600]}" for g in top_grants]
+    fetch = tracing.bind(_retrieve_candidates)
+    with ThreadPoolExecutor(max_workers=min(len(queries), FANOUT_WORKERS)) as pool:
+        futures = [pool.submit(fetch, COLLABORATORS_KB, q) for q in queries]
+        return [f.result() for f in futures]
+
+
+def _policy_query(expertise: str, top_grants: tuple[str, ...]) -> str:
+    agencies = re.findall(r"\b(?:NSF|NIH|DOE|DOD|NASA|NEH|USDA)\b", " ".join(top_grants))
+    return (" ".join(agencies) or expertise) + " grant proposal submission guidelines compliance budget"
+
+
+# Retrieval for pipeline and parallel modes as a stage graph. The ranked
+# candidates of each retrieval are memoized on their inputs (see
+# stage_graph.py), so a re-run after an intake-form edit repeats only what
+# the edit reaches: new interests re-rank the grants, while collaborators and
+# policies for grants still on top, and everything after a Role or Career
+# Stage edit, are reused. Selection (dedupe + token budget) is per run and
+# never memoized: "grants" runs every time, the rest in _pipeline_retrieval.
+_PIPELINE_GRAPH = StageGraph(
+    [
+        Stage("intake_interests", ("cv_text",), _intake_interests, memo=False),
+        Stage("expertise", ("cv_text",), _extract_expertise, memo=False),
+        Stage("strengths", ("intake_interests", "expertise"), _join_strengths, memo=False),
+        Stage("grant_candidates", ("strengths",), lambda q: _retrieve_candidates(GRANTS_KB, q),
+              ttl=_KB_CACHE_TTLS[GRANTS_KB]),
+        Stage("grants", ("grant_candidates",), lambda ranked: _select_chunks(GRANTS_KB, ranked), memo=False),
+        Stage("top_grants", ("grants",), _top_grants, memo=False),
+        Stage("collaborator_candidates", ("expertise", "top_grants"), _collaborator_candidates,
+              ttl=_KB_CACHE_TTLS[COLLABORATORS_KB]),
+        Stage("policy_query", ("expertise", "top_grants"), _policy_query, memo=False),
+        Stage("policy_candidates", ("policy_query",), lambda q: _retrieve_candidates(POLICIES_KB, q),
+              ttl=_KB_CACHE_TTLS[POLICIES_KB]),
+    ],
+    max_entries=int(os.getenv("STAGE_CACHE_MAX_ENTRIES", 256)),
+)
+
+# Progress events for the graph's retrieval stages, named like the agent's tools
+_STAGE_TOOLS = {
+    "grant_candidates": "search_grant_opportunities",
+    "collaborator_candidates": "search_collaborators_for_grants",
+    "policy_candidates": "search_institutional_policies",
+}
+
+
+def _pipeline_context(grants: tuple, collaborators: list[tuple], policies: tuple) -> str:
+    return "\n\n".join(
+        [_format_section("CANDIDATE GRANTS:", grants)]
+        + [
+            _format_section(f"CANDIDATE COLLABORATORS FOR GRANT RESULT {i}:", ranked)
+            for i, ranked in enumerate(collaborators, 1)
+        ]
+        + [_format_section("INSTITUTIONAL POLICIES & GUIDELINES:", policies)]
+    )
+
+
 # ---------------------------------------------------------------------------
+# Parallel synthesis mode
+# ---------------------------------------------------------------------------
+
+# Report field order; the selection call writes the rest, each draft call these
+_MATCH_FIELDS = (
+    "grant_title", "grant_agency", "grant_match_score", "grant_justification",
+    "collaborator_name", "collaborator_department", "collaborator_synergy_score",
+    "collaborator_justification", "draft_proposal", "draft_email",
+)
+_DRAFT_FIELDS = ("grant_justification", "collaborator_justification", "draft_proposal", "draft_email")
 
-def _parse_output(text: str) -> dict:
-    """Extract and parse the JSON payload from the agent's response."""
 
-    # 1. Try to strip ```json ... ``` code fences if the model added them
-    fenced = re.search(r"```(?:json)?\s*([\s\S]*?)\s*```", text)
-    candidate = fenced.group(1).strip() if fenced else text.strip()
+def _report_part(callback, *part) -> None:
+    """Hand a finished piece of the report to `callback` (stream_agent turns these into events)."""
+    if callback is not None:
+        callback(report_part=part)
+
+
+def run_parallel(cv_text: str, callback=None) -> dict:
+    """
+    Run FundingForge with pipeline retrieval and per-match synthesis.
+
+    After the same retrieval as run_pipeline, one short model call selects
+    and scores the three grant–collaborator matches; each match's
+    justifications, proposal and email are then written by its own model
+    call, all concurrently, so generation takes about as long as the
+    slowest single match. The pieces are merged into the usual report.
+    """
+    grants, collaborators, policies = _pipeline_retrieval(cv_text, callback)
+    context = _pipeline_context(grants, collaborators, policies)
+
+    _notify(callback, "select_matches")
+    prompt = _cv_prompt(
+        "Analyze this researcher's CV and the retrieved context, then select and score the matches. "
+        "Remember: output ONLY the JSON object, nothing else.",
+        cv_text,
+        f"--- RETRIEVED CONTEXT START ---\n{context}\n--- RETRIEVED CONTEXT END ---",
+    )
+    with tracing.span("select_matches", "stage"):
+        selection_text = str(_new_agent("select", null_callback_handler)(prompt))
+    with tracing.span("parse_selection", "parse", input_chars=len(selection_text)) as span:
+        selection = _parse_output(selection_text, text_fields=("collaborator_department",))
+        span.attrs["parse_error"] = bool(selection.get("_parse_error"))
+    if selection.get("_parse_error"):
+        return selection
+    _report_part(callback, "researcher_summary", selection["researcher_summary"])
+
+    _notify(callback, "draft_matches")
+    picks = selection["matches"]
+    drafts: list = [None] * len(picks)
+    draft = tracing.bind(_draft_match)
+    with tracing.span("parallel_synthesis", "stage", matches=len(picks)), \
+            ThreadPoolExecutor(max_workers=min(len(picks), FANOUT_WORKERS)) as pool:
+        futures = {
+            pool.submit(draft, i, pick, cv_text, grants[0], collaborators, policies[0]): i
+            for i, pick in enumerate(picks)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            drafts[i] = future.result()
+            _report_part(callback, "match", i, _merge_match(picks[i], drafts[i][0]))
+
+    matches = [_merge_match(pick, fields) for pick, (fields, _, _) in zip(picks, drafts)]
+    result, problems = validate_report({"researcher_summary": selection["researcher_summary"], "matches": matches})
+    notes = selection.get("_repairs", []) + [note for _, _, draft_notes in drafts for note in draft_notes]
+    if notes or problems:
+        result["_repairs"] = notes + problems
+    if any(len(fields) < len(_DRAFT_FIELDS) for fields, _, _ in drafts):
+        result["_incomplete"] = True  # a draft fell short; keep the report out of the result cache
+    result["_raw"] = "\n\n".join([selection_text] + [raw for _, raw, _ in drafts])
+    return result
+
+
+def _merge_match(pick: dict, fields: dict) -> dict:
+    merged = {**pick, **fields}
+    return {key: merged.get(key, "") for key in _MATCH_FIELDS}
+
+
+def _collaborator_chunks(name, chunks: list[str]) -> list[str]:
+    """
+    The chunks about collaborator `name`: those naming them in full, else
+    those with their surname as a whole word, else every chunk.
+    """
+    words = [w for w in (re.sub(r"[^\w\s-]", " ", str(name or "")).split()) if w]
+    if not words:
+        return chunks
+    patterns = [r"\s+".join(map(re.escape, words)), re.escape(words[-1])]
+    for pattern in patterns:
+        found = [c for c in chunks if re.search(rf"(?<![\w-]){pattern}(?![\w-])", c, re.IGNORECASE)]
+        if found:
+            return found
+    return chunks
 
-    # 2. If still not starting with {, find the outermost {...} block
-    if not candidate.startswith("{"):
-        brace = re.search(r"\{[\s\S]*\}", candidate)
-        candidate = brace.group(0) if brace else candidate
 
-    # 3. Attempt JSON parse
+def _draft_match(index: int, pick: dict, cv_text: str, grant_chunks: list[str],
+                 collaborators: list[tuple], policy_chunks: list[str]) -> tuple[dict, str, list[str]]:
+    """Write one match's text fields; returns (fields, raw model output, problems)."""
+    grant_result = pick.get("grant_result")
+    if isinstance(grant_result, int) and 1 <= grant_result <= len(grant_chunks):
+        grant_text = grant_chunks[grant_result - 1]
+    else:
+        grant_text = "\n\n".join(grant_chunks)
+    collab_chunks = [c for chunks, _ in collaborators for c in chunks]
+    collab_text = "\n\n".join(_collaborator_chunks(pick.get("collaborator_name"), collab_chunks))
+
+    selected = {key: pick[key] for key in _MATCH_FIELDS if key in pick}
+    prompt = _cv_prompt(
+        "Write the application materials for this match. "
+        "Remember: output ONLY the JSON object, nothing else.",
+        cv_text,
+        f"--- SELECTED MATCH ---\n{json.dumps(selected, indent=2, ensure_ascii=False)}\n\n"
+        f"--- GRANT ---\n{grant_text}\n\n"
+        f"--- COLLABORATOR ---\n{collab_text}\n\n"
+        f"--- INSTITUTIONAL POLICIES ---\n{_format_chunks(policy_chunks)}",
+    )
+    with tracing.span("draft_match", "stage", match=index + 1) as span:
+        try:
+            raw = str(_new_agent("draft", null_callback_handler)(prompt))
+        except Exception as e:
+            logger.warning("Drafting match %d failed", index + 1, exc_info=True)
+            span.attrs["error"] = type(e).__name__
+            return {}, "", [f"match {index + 1}: drafting failed ({type(e).__name__})"]
+        try:
+            data, notes = parse_json_object(raw)
+        except ReportParseError as e:
+            span.attrs["parse_error"] = True
+            return {}, raw, [f"match {index + 1}: draft unparseable ({e})"]
+    fields = {key: data[key] for key in _DRAFT_FIELDS if isinstance(data, dict) and isinstance(data.get(key), str)}
+    return fields, raw, [f"match {index + 1} draft: {note}" for note in notes]
+
+
+# ---------------------------------------------------------------------------
+# Streaming entry point
+# ---------------------------------------------------------------------------
+
+def stream_agent(cv_text: str, callback=None, mode: str | None = None, force_refresh: bool = False):
+    """
+    Run FundingForge and yield results as the model writes them.
+
+    The run executes on a worker thread; model text deltas are parsed
+    incrementally on the caller's thread, which receives dict events:
+
+        {"event": "tool", "name": str}                  a tool call started
+        {"event": "researcher_summary", "value": str}   summary finished
+        {"event": "match", "index": int, "value": dict} matches[index] finished
+        {"event": "result", "value": dict}              final _parse_output dict
+
+    `callback` is still forwarded every raw Strands event, on the worker thread.
+    """
+    events: queue.Queue = queue.Queue()
+    done = object()
+
+    def on_event(**kwargs):
+        if callback is not None:
+            callback(**kwargs)
+        if "data" in kwargs:
+            events.put(("data", kwargs["data"]))
+        tool_use = kwargs.get("current_tool_use")
+        if isinstance(tool_use, dict) and tool_use.get("name"):
+            events.put(("tool", tool_use["name"]))
+        if "report_part" in kwargs:
+            events.put(("part", kwargs["report_part"]))
+
+    def worker():
+        try:
+            events.put(("result", run_agent(cv_text, callback=on_event, mode=mode, force_refresh=force_refresh)))
+        except BaseException as e:
+            events.put(("error", e))
+        finally:
+            events.put((done, None))
+
+    threading.Thread(target=worker, name="fundingforge-stream", daemon=True).start()
+
+    parser = IncrementalReportParser()
+    last_tool = None
+    while True:
+        kind, payload = events.get()
+        if kind is done:
+            return
+        if kind == "data":
+            for item in parser.feed(payload):
+                if item[0] == "match":
+                    try:
+                        _clamp_scores(item[2])
+                    except (TypeError, ValueError, OverflowError):
+                        pass  # left for _parse_output to reject in the final result
+                    yield {"event": "match", "index": item[1], "value": item[2]}
+                else:
+                    yield {"event": item[0], "value": item[1]}
+        elif kind == "tool":
+            # The report is written after the last tool call; drop earlier turns' text
+            parser.reset()
+            if payload != last_tool:
+                last_tool = payload
+                yield {"event": "tool", "name": payload}
+        elif kind == "part":
+            # run_parallel hands over finished pieces directly instead of streaming text
+            if payload[0] == "match":
+                yield {"event": "match", "index": payload[1], "value": payload[2]}
+            else:
+                yield {"event": payload[0], "value": payload[1]}
+        elif kind == "result":
+            yield {"event": "result", "value": payload}
+        elif kind == "error":
+            raise payload
+
+
+# ---------------------------------------------------------------------------
+# Output parser
+# ---------------------------------------------------------------------------
+
+# When local repair fails, ask the model to fix just the JSON (one short call)
+# instead of surfacing a parse error; JSON_REPAIR_CALL=0 disables it
+JSON_REPAIR_CALL = os.getenv("JSON_REPAIR_CALL", "1") != "0"
+
+
+def _parse_output(text: str, text_fields: tuple[str, ...] = TEXT_MATCH_FIELDS) -> dict:
+    """
+    Extract, repair and schema-check the JSON payload from the agent's response
+    (see report_parser.py). Anything that had to be fixed or dropped is listed
+    under '_repairs'; an unrecoverable payload gives a '_parse_error' dict
+    whose '_parse_issues' say why.
+    """
     try:
-        data = json.loads(candidate)
-        data["_raw"] = text
-        # Clamp all scores to [0, 100]
-        for match in data.get("matches", []):
-            for key in ("grant_match_score", "collaborator_synergy_score"):
-                if key in match:
-                    match[key] = min(100, max(0, int(match[key])))
-        return data
-    except (json.JSONDecodeError, ValueError):
+        data, notes = parse_report(text, text_fields)
+    except ReportParseError as e:
         # Graceful fallback so the UI can still show something
         return {
             "_raw": text,
             "_parse_error": True,
+            "_parse_issues": e.problems,
             "researcher_summary": "Could not parse structured output from the agent.",
             "matches": [],
         }
+    data["_raw"] = text
+    if notes:
+        data["_repairs"] = notes
+    return data
+
+
+def _repair_with_model(text: str, failed: dict, text_fields: tuple[str, ...] = TEXT_MATCH_FIELDS) -> dict:
+    """
+    Have the model rewrite an unparseable report as valid JSON, without
+    redoing retrieval. `failed` is the _parse_output error dict for `text`;
+    it is returned, with the reason added, if the repair call itself fails.
+    """
+    issues = failed["_parse_issues"]
+    prompt = (
+        "Problems found:\n" + "\n".join(f"- {issue}" for issue in issues)
+        + f"\n\n--- BROKEN REPORT START ---\n{text}\n--- BROKEN REPORT END ---"
+    )
+    with tracing.span("json_repair_call", "stage", input_chars=len(text)) as span:
+        try:
+            repaired = str(_new_agent("repair", null_callback_handler)(prompt))
+        except Exception as e:
+            logger.warning("JSON repair call failed", exc_info=True)
+            span.attrs["error"] = type(e).__name__
+            failed["_parse_issues"] = issues + [f"repair call failed ({type(e).__name__})"]
+            return failed
+        result = _parse_output(repaired, text_fields)
+        span.attrs["parse_error"] = bool(result.get("_parse_error"))
+    result["_raw"] = text
+    if result.get("_parse_error"):
+        result["_parse_issues"] = issues + [f"after repair call: {i}" for i in result["_parse_issues"]]
+    else:
+        result["_repairs"] = issues + ["rewritten by repair call"] + result.get("_repairs", [])
+    return result
+
+
+def _clamp_scores(match: dict) -> dict:
+    """Clamp all scores to [0, 100]."""
+    for key in ("grant_match_score", "collaborator_synergy_score"):
+        if key in match:
+            match[key] = min(100, max(0, int(match[key])))
+    return match
@@ -1,9 +1,15 @@
-import io
+import functools
+import importlib
 import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 import streamlit as st
-from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
-from pypdf import PdfReader
-from agents import run_agent
+from dotenv import load_dotenv
+
+# Load .env before the local imports below, which read their settings at import time
+load_dotenv()
+
+from cv_intake import enrich_cv, extract_pdf_text
+from jobs import DONE, FAILED, JobRunner
 
 # ---------------------------------------------------------------------------
 # Page config
@@ -249,14 +255,58 @@ hr { border-color: #30363D !important; margin: 1.2rem 0 !important; }
 </style>
 """, unsafe_allow_html=True)
 
+# ---------------------------------------------------------------------------
+# Agent stack loader — `agents` pulls in strands, boto3 and the KB client, so
+# it is imported on a background thread once per server process while the
+# intake page renders, then warmed up. Callers block only if they need it
+# before the import has finished.
+# ---------------------------------------------------------------------------
+
+def _import_agents():
+    module = importlib.import_module("agents")
+    threading.Thread(target=module.warm_up, name="agents-warm-up", daemon=True).start()
+    return module
+
+
+@st.cache_resource(show_spinner=False)
+def _agents_loader() -> Future:
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agents-loader")
+    future = executor.submit(_import_agents)
+    executor.shutdown(wait=False)
+    return future
+
+
+def _agents():
+    """Return the loaded `agents` module, waiting for the background import if needed."""
+    try:
+        return _agents_loader().result()
+    except Exception:
+        _agents_loader.clear()  # let the next attempt re-import instead of replaying the failure
+        raise
+
+
+_agents_loader()
+
+
+@st.cache_resource(show_spinner=False)
+def _job_runner() -> JobRunner:
+    """Process-wide job runner: agent runs outlive the script run that submitted them."""
+    return JobRunner(_agents().stream_agent)
+
 # ---------------------------------------------------------------------------
 # Session state initialization
 # ---------------------------------------------------------------------------
-_DEFAULTS = {"stage": "intake", "results": None, "cv_text": "", "profile": {}}
+_DEFAULTS = {"stage": "intake", "results": None, "cv_text": "", "profile": {}, "force_refresh": False, "job_id": None,
+             "failure": None}
 for _k, _v in _DEFAULTS.items():
     if _k not in st.session_state:
         st.session_state[_k] = _v
 
+# A refreshed browser starts a new session; the job id in the URL picks the run back up
+if st.session_state.stage == "intake" and st.query_params.get("job"):
+    st.session_state.job_id = st.query_params["job"]
+    st.session_state.stage = "processing"
+
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
@@ -278,6 +328,14 @@ def _build_report(result: dict) -> str:
     return "\n".join(lines)
 
 
+def _full_report(result: dict) -> str:
+    """The Markdown report for `result`, built on first download and kept on the results dict."""
+    report = result.get("_report_md")
+    if report is None:
+        report = result["_report_md"] = _build_report(result)
+    return report
+
+
 def _compliance_items(agency: str) -> list[tuple]:
     """Return (icon, label, description) tuples for the compliance checklist."""
     agency_up = (agency or "").upper()
@@ -309,6 +367,25 @@ def _compliance_items(agency: str) -> list[tuple]:
     return base
 
 
+@functools.lru_cache(maxsize=32)
+def _compliance_html(agency: str) -> str:
+    """The rendered compliance checklist; the same for every match with this agency."""
+    items_html = "".join(
+        f"""<div class="compliance-row">
+            <span class="compliance-icon">{icon}</span>
+            <div>
+                <div class="compliance-label">{label}</div>
+                <div class="compliance-desc">{desc}</div>
+            </div>
+        </div>"""
+        for icon, label, desc in _compliance_items(agency)
+    )
+    return (
+        f'<div style="background:#0D1117;border:1px solid #21262D;'
+        f'border-radius:8px;padding:8px 14px;margin-bottom:12px">{items_html}</div>'
+    )
+
+
 def _brand_bar(badge: str) -> None:
     st.markdown(
         f"""<div class="brand-bar">
@@ -382,6 +459,12 @@ def render_intake() -> None:
                 key="cv_upload",
             )
 
+            force_refresh = st.checkbox(
+                "Force refresh",
+                key="chk_force_refresh",
+                help="Ignore any saved report for this CV and run the agent again.",
+            )
+
             st.markdown("<div style='height:8px'></div>", unsafe_allow_html=True)
 
             forge_btn = st.button(
@@ -393,8 +476,7 @@ def render_intake() -> None:
 
         if forge_btn and uploaded_file:
             try:
-                reader = PdfReader(io.BytesIO(uploaded_file.read()))
-                cv_raw = "\n".join(p.extract_text() or "" for p in reader.pages).strip()
+                cv_raw = extract_pdf_text(uploaded_file.read())
             except Exception as e:
                 st.error(f"Failed to read PDF: {e}")
                 st.stop()
@@ -404,16 +486,20 @@ def render_intake() -> None:
                 st.stop()
 
             # Enrich with intake form context
-            enriched = (
-                f"Researcher Profile from intake form:\n"
-                f"- Role: {role}\n"
-                f"- Career Stage: {year}\n"
-                f"- Stated Research Interests: {interests or 'Not provided'}\n\n"
-                f"--- CV CONTENT ---\n{cv_raw}"
-            )
-            st.session_state.cv_text = enriched
+            st.session_state.cv_text = enrich_cv(cv_raw, role, year, interests)
             st.session_state.profile = {"role": role, "year": year, "interests": interests}
-            st.session_state.stage = "processing"
+            st.session_state.force_refresh = force_refresh
+
+            # Same CV, profile, prompt and model as a saved report → skip the agent run
+            cached = None if force_refresh else _agents().get_cached_result(st.session_state.cv_text)
+            if cached is not None:
+                st.session_state.results = cached
+                st.session_state.stage = "results"
+            else:
+                job_id = _job_runner().submit(st.session_state.cv_text, force_refresh=force_refresh)
+                st.session_state.job_id = job_id
+                st.query_params["job"] = job_id
+                st.session_state.stage = "processing"
             st.rerun()
 
 
@@ -421,6 +507,33 @@ def render_intake() -> None:
 # Stage 2 — Processing
 # ---------------------------------------------------------------------------
 
+_TOOL_MSGS = {
+    "search_grant_opportunities":        "Querying grant Knowledge Base…",
+    "search_collaborators_for_grants":   "Finding collaborators for all 3 grants in parallel…",
+    "search_institutional_policies":     "Retrieving compliance & policy guidelines…",
+    "select_matches":                    "Selecting the best grant & collaborator matches…",
+    "draft_matches":                     "Drafting proposals and emails for all 3 matches in parallel…",
+}
+
+
+def _back_to_start(key: str) -> None:
+    if st.button("↩ Back to Start", key=key):
+        st.session_state.stage = "intake"
+        st.session_state.job_id = None
+        st.session_state.failure = None
+        st.query_params.pop("job", None)
+        st.rerun()
+
+
+def _fail(message: str, raw: str | None = None) -> None:
+    """Leave the polling fragment for the error stage, which renders once and stops polling."""
+    st.session_state.failure = {"message": message, "raw": raw}
+    st.session_state.stage = "error"
+    st.session_state.job_id = None
+    st.query_params.pop("job", None)
+    st.rerun()
+
+
 def render_processing() -> None:
     _brand_bar("Forging")
 
@@ -434,57 +547,74 @@ def render_processing() -> None:
             "⚒️ Forging your packet…</p>",
             unsafe_allow_html=True,
         )
+        _job_progress()
+
+
+@st.fragment(run_every=1.0)
+def _job_progress() -> None:
+    """Poll the background job once a second; only this fragment reruns meanwhile."""
+    job = _job_runner().get(st.session_state.job_id) if st.session_state.job_id else None
+    if job is None:
+        _fail("This run is no longer available — it may have expired or the server restarted.")
+        return
 
+    finished = job.status in (DONE, FAILED)
+    with st.status("Agent pipeline running…", expanded=True) as status:
+        st.write("Analyzing CV and extracting researcher profile…")
         called_tools: set = set()
-        _script_ctx = get_script_run_ctx()
-
-        with st.status("Agent pipeline running…", expanded=True) as status:
-            st.write("Analyzing CV and extracting researcher profile…")
-
-            def on_event(**kwargs):
-                add_script_run_ctx(threading.current_thread(), _script_ctx)
-                tool_name = None
-                for key in ("current_tool_use", "tool_use", "toolUse"):
-                    val = kwargs.get(key)
-                    if isinstance(val, dict):
-                        tool_name = val.get("name") or val.get("toolName")
-                        break
-                if not tool_name or tool_name in called_tools:
-                    return
-                called_tools.add(tool_name)
-                msgs = {
-                    "search_grant_opportunities":        "Querying grant Knowledge Base…",
-                    "search_complementary_collaborators": f"Finding collaborator for grant {max(1, len(called_tools) - 1)}/3…",
-                    "search_institutional_policies":     "Retrieving compliance & policy guidelines…",
-                }
-                msg = msgs.get(tool_name)
+        for event in list(job.events):
+            kind = event["event"]
+            if kind == "tool" and event["name"] not in called_tools:
+                called_tools.add(event["name"])
+                msg = _TOOL_MSGS.get(event["name"])
                 if msg:
                     st.write(msg)
+            elif kind == "researcher_summary":
+                st.write("Researcher profile ready — drafting matches…")
+            elif kind == "match":
+                match = event["value"]
+                st.write(
+                    f"Match {event['index'] + 1}: **{match.get('grant_title', 'Untitled grant')}** "
+                    f"— {match.get('grant_match_score', 0)}% fit, "
+                    f"with {match.get('collaborator_name', 'a collaborator')}"
+                )
+        if job.status == DONE:
+            st.write("Synthesizing final packet…")
+            status.update(label="Packet forged successfully!", state="complete", expanded=False)
+        elif job.status == FAILED:
+            status.update(label="An error occurred.", state="error", expanded=True)
+
+    if not finished:
+        return
+    if job.status == FAILED:
+        _fail(f"Agent error — {job.error}")
+        return
+
+    result = job.result or {}
+    if result.get("_parse_error") or not result.get("matches"):
+        _fail("The agent did not return structured results.", result.get("_raw", ""))
+        return
+
+    st.session_state.results = result
+    st.session_state.stage = "results"
+    st.query_params.pop("job", None)
+    st.rerun()
+
+
+def render_error() -> None:
+    """A finished run that produced no results, kept in session state once its job stops polling."""
+    _brand_bar("Forging")
 
-            try:
-                result = run_agent(st.session_state.cv_text, callback=on_event)
-                st.write("Synthesizing final packet…")
-                status.update(label="Packet forged successfully!", state="complete", expanded=False)
-            except BaseException as e:
-                status.update(label="An error occurred.", state="error", expanded=True)
-                st.error(f"Agent error — {type(e).__name__}: {e}")
-                if st.button("↩ Back to Start"):
-                    st.session_state.stage = "intake"
-                    st.rerun()
-                st.stop()
+    st.markdown("<div style='height:40px'></div>", unsafe_allow_html=True)
+    _, center, _ = st.columns([1, 2, 1])
 
-        if result.get("_parse_error") or not result.get("matches"):
-            st.error("The agent did not return structured results.")
+    with center:
+        failure = st.session_state.failure or {"message": "The run did not finish."}
+        st.error(failure["message"])
+        if failure.get("raw") is not None:
             with st.expander("Raw agent output"):
-                st.code(result.get("_raw", ""), language=None)
-            if st.button("↩ Back to Start", key="back_parse"):
-                st.session_state.stage = "intake"
-                st.rerun()
-            st.stop()
-
-        st.session_state.results = result
-        st.session_state.stage = "results"
-        st.rerun()
+                st.code(failure["raw"], language=None)
+        _back_to_start("back_error")
 
 
 # ---------------------------------------------------------------------------
@@ -503,8 +633,12 @@ def render_results() -> None:
         if st.button("↺  Reset", type="secondary"):
             for k in list(_DEFAULTS.keys()):
                 st.session_state.pop(k, None)
+            st.query_params.pop("job", None)
             st.rerun()
 
+    if result.get("_cache_hit"):
+        st.caption("Loaded from a saved report for this CV. Tick “Force refresh” on the intake form to regenerate.")
+
     st.markdown("<div style='height:20px'></div>", unsafe_allow_html=True)
 
     # ── Researcher profile + top metrics ──────────────────────────────────
@@ -537,10 +671,11 @@ def render_results() -> None:
         st.markdown("<div style='height:12px'></div>", unsafe_allow_html=True)
         st.download_button(
             label="⬇ Download Full Report",
-            data=_build_report(result),
+            data=lambda: _full_report(result),
             file_name="fundingforge_report.md",
             mime="text/markdown",
             use_container_width=True,
+            on_click="ignore",
         )
 
     # ── Grant Matches ──────────────────────────────────────────────────────
@@ -552,104 +687,98 @@ def render_results() -> None:
             unsafe_allow_html=True,
         )
 
-        medals = ["🥇", "🥈", "🥉"]
-
         for i, match in enumerate(matches[:3], 1):
-            grant_score  = match.get("grant_match_score", 0)
-            collab_score = match.get("collaborator_synergy_score", 0)
-            title        = match.get("grant_title", f"Grant {i}")
-            agency       = match.get("grant_agency", "")
-            medal        = medals[i - 1]
-
-            with st.expander(
-                f"{medal}  {title}  —  {grant_score}% Match",
-                expanded=(i == 1),
-            ):
-                # Score row
-                sc1, sc2 = st.columns(2)
-                with sc1:
-                    st.metric("Grant Match", f"{grant_score}%")
-                    st.progress(grant_score / 100)
-                with sc2:
-                    st.metric("Collaborator Synergy", f"{collab_score}%")
-                    st.progress(collab_score / 100)
-
-                if agency:
-                    st.caption(f"Funding Agency: **{agency}**")
-
-                st.markdown("**Why this grant fits your profile**")
-                st.info(match.get("grant_justification", ""))
-
-                # Collaborator mesh card
-                collab_name = match.get("collaborator_name", "Unknown Collaborator")
-                collab_dept = match.get("collaborator_department", "")
-                collab_just = match.get("collaborator_justification", "")
-                st.markdown(
-                    f"""<div class="collab-card">
-                        <div class="name">🤝 &nbsp; {collab_name}</div>
-                        <div class="dept">{collab_dept}</div>
-                        <p style="margin-top:10px;font-size:0.9rem;color:#C9D1D9">{collab_just}</p>
-                        <div style="margin-top:6px">
-                            <span class="score-chip">{collab_score}% Synergy</span>
-                        </div>
-                    </div>""",
-                    unsafe_allow_html=True,
-                )
+            _match_card(i, match)
+
+
+_MEDALS = ["🥇", "🥈", "🥉"]
+
+
+@st.fragment
+def _match_card(i: int, match: dict) -> None:
+    """One grant match; editing its drafts reruns only this fragment, not the whole dashboard."""
+    grant_score  = match.get("grant_match_score", 0)
+    collab_score = match.get("collaborator_synergy_score", 0)
+    title        = match.get("grant_title", f"Grant {i}")
+    agency       = match.get("grant_agency", "")
+    medal        = _MEDALS[i - 1]
+
+    with st.expander(
+        f"{medal}  {title}  —  {grant_score}% Match",
+        expanded=(i == 1),
+    ):
+        # Score row
+        sc1, sc2 = st.columns(2)
+        with sc1:
+            st.metric("Grant Match", f"{grant_score}%")
+            st.progress(grant_score / 100)
+        with sc2:
+            st.metric("Collaborator Synergy", f"{collab_score}%")
+            st.progress(collab_score / 100)
+
+        if agency:
+            st.caption(f"Funding Agency: **{agency}**")
+
+        st.markdown("**Why this grant fits your profile**")
+        st.info(match.get("grant_justification", ""))
+
+        # Collaborator mesh card
+        collab_name = match.get("collaborator_name", "Unknown Collaborator")
+        collab_dept = match.get("collaborator_department", "")
+        collab_just = match.get("collaborator_justification", "")
+        st.markdown(
+            f"""<div class="collab-card">
+                <div class="name">🤝 &nbsp; {collab_name}</div>
+                <div class="dept">{collab_dept}</div>
+                <p style="margin-top:10px;font-size:0.9rem;color:#C9D1D9">{collab_just}</p>
+                <div style="margin-top:6px">
+                    <span class="score-chip">{collab_score}% Synergy</span>
+                </div>
+            </div>""",
+            unsafe_allow_html=True,
+        )
 
-                # Compliance checklist
-                st.markdown("**Compliance Checklist**")
-                items_html = "".join(
-                    f"""<div class="compliance-row">
-                        <span class="compliance-icon">{icon}</span>
-                        <div>
-                            <div class="compliance-label">{label}</div>
-                            <div class="compliance-desc">{desc}</div>
-                        </div>
-                    </div>"""
-                    for icon, label, desc in _compliance_items(agency)
-                )
-                st.markdown(
-                    f'<div style="background:#0D1117;border:1px solid #21262D;'
-                    f'border-radius:8px;padding:8px 14px;margin-bottom:12px">{items_html}</div>',
-                    unsafe_allow_html=True,
-                )
+        # Compliance checklist
+        st.markdown("**Compliance Checklist**")
+        st.markdown(_compliance_html(agency), unsafe_allow_html=True)
+
+        st.divider()
+
+        # Proposal + Email tabs
+        tab_proposal, tab_email = st.tabs(["📄 Proposal Assistant", "✉️ Outreach Email"])
+
+        with tab_proposal:
+            proposal_key = f"proposal_{i}"
+            if proposal_key not in st.session_state:
+                st.session_state[proposal_key] = match.get("draft_proposal", "")
+            edited = st.text_area(
+                "Edit the proposal draft below:",
+                value=st.session_state[proposal_key],
+                height=260,
+                key=f"ta_proposal_{i}",
+                label_visibility="collapsed",
+            )
+            st.download_button(
+                label=f"⬇ Download Proposal — {title[:40]}",
+                data=edited,
+                file_name=f"proposal_grant_{i}.md",
+                mime="text/markdown",
+                key=f"dl_proposal_{i}",
+                on_click="ignore",
+            )
 
-                st.divider()
-
-                # Proposal + Email tabs
-                tab_proposal, tab_email = st.tabs(["📄 Proposal Assistant", "✉️ Outreach Email"])
-
-                with tab_proposal:
-                    proposal_key = f"proposal_{i}"
-                    if proposal_key not in st.session_state:
-                        st.session_state[proposal_key] = match.get("draft_proposal", "")
-                    edited = st.text_area(
-                        "Edit the proposal draft below:",
-                        value=st.session_state[proposal_key],
-                        height=260,
-                        key=f"ta_proposal_{i}",
-                        label_visibility="collapsed",
-                    )
-                    st.download_button(
-                        label=f"⬇ Download Proposal — {title[:40]}",
-                        data=edited,
-                        file_name=f"proposal_grant_{i}.md",
-                        mime="text/markdown",
-                        key=f"dl_proposal_{i}",
-                    )
-
-                with tab_email:
-                    raw_email = match.get("draft_email", "_No email generated._").replace("\\n", "\n")
-                    email_key = f"email_{i}"
-                    if email_key not in st.session_state:
-                        st.session_state[email_key] = raw_email
-                    st.text_area(
-                        "Edit the outreach email below:",
-                        value=st.session_state[email_key],
-                        height=260,
-                        key=f"ta_email_{i}",
-                        label_visibility="collapsed",
-                    )
+        with tab_email:
+            raw_email = match.get("draft_email", "_No email generated._").replace("\\n", "\n")
+            email_key = f"email_{i}"
+            if email_key not in st.session_state:
+                st.session_state[email_key] = raw_email
+            st.text_area(
+                "Edit the outreach email below:",
+                value=st.session_state[email_key],
+                height=260,
+                key=f"ta_email_{i}",
+                label_visibility="collapsed",
+            )
 
 
 # ---------------------------------------------------------------------------
@@ -658,6 +787,7 @@ def render_results() -> None:
 _STAGES = {
     "intake":     render_intake,
     "processing": render_processing,
+    "error":      render_error,
     "results":    render_results,
 }
 _STAGES.get(st.session_state.stage, render_intake)()
@@ -0,0 +1,71 @@
+import os
+import threading
+
+import boto3
+from botocore.config import Config
+
+# ---------------------------------------------------------------------------
+# Configuration – one tuned botocore Config per service, shared by every
+# client FundingForge builds (KB retrieval, Titan embeddings, Claude). Read
+# when the first client is built, so values from .env are honoured whatever
+# the import order.
+#
+# botocore's adaptive retries are the only retry layer for AWS calls: they
+# back off on throttles and rate-limit the whole client across threads, so
+# callers do not wrap these clients in retry loops of their own.
+# ---------------------------------------------------------------------------
+
+# Service -> (env var, default) for the region its clients use. The Knowledge
+# Bases live in us-east-1; everything else follows the AWS region settings.
+_SERVICE_REGIONS = {
+    "bedrock-agent-runtime": ("KB_REGION", "us-east-1"),
+}
+
+# Read timeouts (seconds between bytes): KB retrieves answer quickly, model
+# calls can think for a long time before the first token
+_READ_TIMEOUTS = {
+    "bedrock-agent-runtime": ("KB_READ_TIMEOUT", 10),
+    "bedrock-runtime": ("BEDROCK_READ_TIMEOUT", 120),
+}
+_DEFAULT_READ_TIMEOUT = 60
+
+_clients: dict[tuple[str, str], object] = {}
+_clients_lock = threading.Lock()
+
+
+def client_region(service: str) -> str:
+    """The region `service`'s clients use: its own override, else AWS_REGION / AWS_DEFAULT_REGION."""
+    env, default = _SERVICE_REGIONS.get(service, (None, None))
+    if env:
+        return os.getenv(env) or default
+    return os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION") or "us-east-1"
+
+
+def client_config(service: str) -> Config:
+    """The botocore Config used for `service`'s clients."""
+    env, default = _READ_TIMEOUTS.get(service, (None, _DEFAULT_READ_TIMEOUT))
+    return Config(
+        max_pool_connections=int(os.getenv("BOTO_MAX_POOL_CONNECTIONS", 50)),  # botocore default is 10
+        retries={
+            "mode": os.getenv("BOTO_RETRY_MODE", "adaptive"),  # client-side rate limiting on throttles
+            "total_max_attempts": int(os.getenv("BOTO_MAX_ATTEMPTS", 4)),  # including the first try
+        },
+        connect_timeout=float(os.getenv("BOTO_CONNECT_TIMEOUT", 3)),
+        read_timeout=float(os.getenv(env, default) if env else default),
+        tcp_keepalive=True,
+    )
+
+
+def get_client(service: str, region: str | None = None):
+    """
+    Return the process-wide boto3 client for (service, region), creating it
+    on first use. boto3 clients are thread-safe, so one client (and one
+    connection pool) serves every session and worker thread.
+    """
+    key = (service, region or client_region(service))
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = boto3.client(service, region_name=key[1], config=client_config(service))
+            _clients[key] = client
+    return client
@@ -0,0 +1,201 @@
+"""
+Headless batch runner: process a directory of CV PDFs through FundingForge.
+
+Results are appended to a JSONL file as each CV finishes; that file is also
+the checkpoint, so re-running the same command after a crash skips every CV
+that already has a successful record.
+
+    python batch.py cvs/ --output results.jsonl --concurrency 4 --rpm 20
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import statistics
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+# Load .env before the local imports below, which read their settings at import time
+load_dotenv()
+
+import tracing
+from agents import run_agent
+from cv_intake import enrich_cv, extract_pdf_text
+
+
+# ---------------------------------------------------------------------------
+# Rate limiting
+# ---------------------------------------------------------------------------
+
+class RateLimiter:
+    """Token bucket that spaces agent runs to at most `per_minute` starts per minute."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(max(0.0, start - now))
+
+
+# ---------------------------------------------------------------------------
+# Checkpoint / output
+# ---------------------------------------------------------------------------
+
+def _load_completed(path: str) -> set[str]:
+    """SHA-256 digests of CVs that already have a successful record in `path`."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # torn final line from a crash
+            if record.get("status") == "ok":
+                done.add(record["sha256"])
+    return done
+
+
+def _append(f, record: dict) -> None:
+    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+
+# ---------------------------------------------------------------------------
+# Per-document work
+# ---------------------------------------------------------------------------
+
+def process_cv(path: str, digest: str, args, limiter: RateLimiter) -> dict:
+    """Extract, enrich and run one CV; throttles are retried inside the Bedrock client."""
+    record = {"file": os.path.basename(path), "sha256": digest}
+    started = time.perf_counter()
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        cv_raw = extract_pdf_text(data)
+        if not cv_raw:
+            raise ValueError("No extractable text found (scanned PDF?)")
+        cv_text = enrich_cv(cv_raw, args.role, args.career_stage, args.interests)
+
+        limiter.acquire()
+        result = run_agent(cv_text, callback=_silent, mode=args.mode)
+
+        if not args.keep_raw:
+            result.pop("_raw", None)
+        record.update(status="error" if result.get("_parse_error") else "ok", result=result)
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+    record["latency_s"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+def _silent(**kwargs) -> None:
+    """Callback that suppresses Strands' default stdout streaming."""
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input_dir", help="directory containing CV PDFs")
+    parser.add_argument("--output", default="fundingforge_results.jsonl", help="JSONL results / checkpoint file")
+    parser.add_argument("--concurrency", type=int, default=4, help="CVs processed at once")
+    parser.add_argument("--rpm", type=float, default=20, help="max agent runs started per minute (0 = unlimited)")
+    parser.add_argument("--mode", choices=["agent", "pipeline", "parallel"], default=None, help="run_agent mode")
+    parser.add_argument("--role", default="Faculty", help="intake-form role applied to every CV")
+    parser.add_argument("--career-stage", default="Mid Career (4–10 yrs)", help="intake-form career stage")
+    parser.add_argument("--interests", default="", help="intake-form research interests")
+    parser.add_argument("--keep-raw", action="store_true", help="keep the raw model output in each record")
+    parser.add_argument("--metrics", help="write a Prometheus text snapshot of per-stage latency and tokens here")
+    args = parser.parse_args(argv)
+
+    paths = sorted(
+        os.path.join(args.input_dir, name)
+        for name in os.listdir(args.input_dir)
+        if name.lower().endswith(".pdf")
+    )
+    completed = _load_completed(args.output)
+    pending = []
+    for path in paths:
+        with open(path, "rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+        if digest not in completed:
+            pending.append((path, digest))
+
+    print(f"{len(paths)} PDFs found, {len(paths) - len(pending)} already done, {len(pending)} to process",
+          file=sys.stderr)
+
+    limiter = RateLimiter(args.rpm)
+    latencies: list[float] = []
+    stage_latencies: dict[str, list[float]] = {}
+    stage_models: dict[str, str] = {}
+    failures = 0
+    started = time.perf_counter()
+
+    with open(args.output, "a", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="cv") as pool:
+        futures = [pool.submit(process_cv, path, digest, args, limiter) for path, digest in pending]
+        for future in as_completed(futures):
+            record = future.result()
+            _append(out, record)
+            latencies.append(record["latency_s"])
+            failures += record["status"] != "ok"
+            for stage, agg in record.get("result", {}).get("_trace", {}).get("totals", {}).get("models", {}).items():
+                stage_latencies.setdefault(stage, []).append(agg["duration_s"])
+                stage_models[stage] = agg["model_id"]
+            print(f"[{len(latencies)}/{len(pending)}] {record['file']}: {record['status']} "
+                  f"({record['latency_s']:.1f}s)", file=sys.stderr)
+
+    elapsed = time.perf_counter() - started
+    summary = {
+        "processed": len(latencies),
+        "failed": failures,
+        "elapsed_s": round(elapsed, 1),
+        "throughput_cvs_per_min": round(len(latencies) / elapsed * 60, 2) if elapsed and latencies else 0.0,
+    }
+    if latencies:
+        summary.update(
+            latency_p50_s=round(statistics.median(latencies), 2),
+            latency_p95_s=round(_percentile(latencies, 95), 2),
+            latency_max_s=round(max(latencies), 2),
+        )
+    if stage_latencies:
+        # Model time per CV by stage, for tuning STAGE_MODELS
+        summary["model_stages"] = {
+            stage: {
+                "model_id": stage_models[stage],
+                "p50_s": round(statistics.median(values), 2),
+                "p95_s": round(_percentile(values, 95), 2),
+            }
+            for stage, values in sorted(stage_latencies.items())
+        }
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as f:
+            f.write(tracing.prometheus_snapshot())
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,393 @@
+"""
+Offline end-to-end benchmarks with stubbed Bedrock and Knowledge Base backends.
+
+Runs without AWS: the KB client, the Strands model and demo.py's
+bedrock-runtime client are replaced by the stand-ins in benchmarks/stubs.py,
+with latencies drawn from the distributions given on the command line
+("median_ms:p95_ms"). Every cache lives in a throwaway directory.
+
+    python -m benchmarks.bench_e2e [--quick] [--output e2e.json]
+
+Cases:
+    run_agent   end-to-end latency per mode, model turns and tokens from _trace
+    fanout      search_collaborators_for_grants wall time vs. query count
+    parse       _parse_output throughput on clean, large and malformed output
+    pdf         extract_pdf_text cold and cached, by page count
+    matcher     EmbeddingIndex build / reload / top_k vs. corpus size
+    local_kb    retrieval.LocalBackend index build and query latency vs. corpus size
+    kb_hedge    Bedrock KB retrieve tail latency with and without hedged requests
+    rerun       pipeline / parallel re-runs after an intake-profile edit: latency,
+                KB calls and retrieval stages reused from the stage graph
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+# Keep benchmark caches away from the real ones; must happen before the imports below
+_WORKDIR = tempfile.mkdtemp(prefix="fundingforge-bench-")
+os.environ["FUNDINGFORGE_CACHE_DIR"] = os.path.join(_WORKDIR, "cache")
+os.environ["FUNDINGFORGE_INDEX_DIR"] = os.path.join(_WORKDIR, "index")
+os.environ.pop("KB_CACHE_PATH", None)
+
+import demo
+import agents
+import cv_intake
+from matcher import EmbeddingIndex
+from retrieval import BedrockBackend, LocalBackend
+from benchmarks.stubs import (
+    Latency, StubBedrockRuntime, StubKBClient, StubModel, canned_draft, canned_report, canned_selection, install,
+    synthetic_pdf,
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CV = (
+    "Researcher Profile from intake form:\n- Role: Faculty\n- Career Stage: Mid Career (4–10 yrs)\n"
+    "- Stated Research Interests: neural operators, turbulence modelling\n\n--- CV CONTENT ---\n"
+    + "Jane Smith, Associate Professor of Computational Science.\n"
+    + "\n".join(f"[{i}] Smith J. Neural operators for multiphysics simulation {i}. J Comput Phys {2010 + i % 14}."
+                for i in range(60))
+)
+
+
+def _summary(samples: list[float]) -> dict:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        "n": len(samples),
+        "p50_ms": round(statistics.median(samples) * 1000, 2),
+        "p95_ms": round(p95 * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+    }
+
+
+def _reset_caches() -> None:
+    agents._kb_cache.clear()
+    agents._PIPELINE_GRAPH.clear()
+
+
+# ---------------------------------------------------------------------------
+# Cases
+# ---------------------------------------------------------------------------
+
+def bench_run_agent(kb: StubKBClient, model: StubModel, repeat: int) -> dict:
+    results = {}
+    for mode in agents.MODES:
+        latencies, turns, tokens, kb_calls, saved, cache_hits, stages, stage_hits = [], [], [], [], [], [], {}, {}
+        for _ in range(repeat):
+            _reset_caches()
+            kb.stats.reset()
+            started = time.perf_counter()
+            result = agents.run_agent(_CV, callback=lambda **kwargs: None, mode=mode, force_refresh=True)
+            latencies.append(time.perf_counter() - started)
+            totals = result["_trace"]["totals"]
+            turns.append(totals["by_kind"].get("model", {}).get("count", 0))
+            tokens.append(totals["tokens"]["input_tokens"] + totals["tokens"]["output_tokens"])
+            kb_calls.append(kb.stats.calls)
+            saved.append(result.get("_rerank", {}).get("tokens_saved", 0))
+            cache_hits.append(result.get("_prompt_cache", {}).get("hit_ratio", 0.0))
+            for stage, ratio in result.get("_prompt_cache", {}).get("by_stage", {}).items():
+                stage_hits.setdefault(stage, []).append(ratio)
+            for stage, agg in totals["models"].items():
+                stages.setdefault(stage, []).append(agg["duration_s"])
+            if result.get("_parse_error"):
+                raise RuntimeError(f"{mode}: stub report failed to parse")
+        results[mode] = {
+            **_summary(latencies),
+            "model_turns": statistics.median(turns),
+            "tokens": statistics.median(tokens),
+            "kb_calls": statistics.median(kb_calls),
+            "context_tokens_saved": statistics.median(saved),
+            "prompt_cache_hit_ratio": round(statistics.median(cache_hits), 3),
+            "prompt_cache_hit_ratio_by_stage": {
+                s: round(statistics.median(v), 3) for s, v in sorted(stage_hits.items())
+            },
+            "kb_max_in_flight": kb.stats.max_in_flight,
+            "model_stage_p50_ms": {s: round(statistics.median(v) * 1000, 2) for s, v in sorted(stages.items())},
+        }
+    return results
+
+
+def bench_fanout(kb: StubKBClient, repeat: int) -> dict:
+    results = {}
+    for n in (1, 3, 6):
+        queries = [f"collaborator query {i} for fan-out" for i in range(n)]
+        samples = []
+        for _ in range(repeat):
+            _reset_caches()
+            kb.stats.reset()
+            started = time.perf_counter()
+            agents.search_collaborators_for_grants(queries)
+            samples.append(time.perf_counter() - started)
+        results[f"{n}_queries"] = {**_summary(samples), "kb_max_in_flight": kb.stats.max_in_flight}
+    return results
+
+
+def bench_parse(repeat: int) -> dict:
+    clean = canned_report()
+    large = canned_report(pad=200)
+    inputs = {
+        "clean": clean,
+        "large": large,
+        "fenced_with_preamble": "Here is the report you asked for:\n```json\n" + clean + "\n```\nLet me know!",
+        "truncated": large[: len(large) * 2 // 3],
+        "trailing_comma": clean.replace('Dr. Smith"\n    }\n  ]', 'Dr. Smith",\n    }\n  ]'),
+        "no_json": "I could not find any suitable grants for this researcher. " * 200,
+    }
+    results = {}
+    for name, text in inputs.items():
+        iterations = max(1, repeat * 20)
+        started = time.perf_counter()
+        for _ in range(iterations):
+            parsed = agents._parse_output(text)
+        elapsed = time.perf_counter() - started
+        results[name] = {
+            "bytes": len(text),
+            "per_call_us": round(elapsed / iterations * 1e6, 1),
+            "mb_per_s": round(len(text) * iterations / elapsed / 1e6, 1),
+            "parsed": not parsed.get("_parse_error"),
+        }
+    return results
+
+
+def bench_pdf(pages_list: list[int], repeat: int) -> dict:
+    results = {}
+    for pages in pages_list:
+        data = synthetic_pdf(pages)
+        cold, warm = [], []
+        for _ in range(repeat):
+            cv_intake._text_cache.clear()
+            started = time.perf_counter()
+            text = cv_intake.extract_pdf_text(data)
+            cold.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            cv_intake.extract_pdf_text(data)
+            warm.append(time.perf_counter() - started)
+        results[f"{pages}_pages"] = {
+            "bytes": len(data),
+            "chars": len(text),
+            "cold": _summary(cold),
+            "cached": _summary(warm),
+        }
+    return results
+
+
+def bench_matcher(runtime: StubBedrockRuntime, sizes: list[int], repeat: int) -> dict:
+    model_id = f"{demo.EMBED_MODEL_ID}:{demo.EMBED_DIMENSIONS}"
+    query = demo.get_embedding("neural operators for turbulence and multiphysics simulation")
+    results = {}
+    for size in sizes:
+        corpus = [
+            {"name": f"Dr. Researcher {i}", "text_for_embedding": f"Researcher {i} studies topic {i % 97} and method {i % 13}."}
+            for i in range(size)
+        ]
+        name = f"bench-{size}"
+        demo.embedding_cache.clear()
+        runtime.stats.reset()
+        started = time.perf_counter()
+        index = EmbeddingIndex.build(name, corpus, demo.embed_many, model_id=model_id)
+        build_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index = EmbeddingIndex.build(name, corpus, demo.embed_many, model_id=model_id)
+        reload_s = time.perf_counter() - started
+
+        samples = []
+        for _ in range(max(5, repeat * 10)):
+            started = time.perf_counter()
+            index.top_k(query, k=5)
+            samples.append(time.perf_counter() - started)
+        results[str(size)] = {
+            "build_s": round(build_s, 3),
+            "embed_calls": runtime.stats.calls,
+            "embed_max_in_flight": runtime.stats.max_in_flight,
+            "reload_ms": round(reload_s * 1000, 2),
+            "top_k": _summary(samples),
+        }
+    return results
+
+
+def bench_local_kb(sizes: list[int], repeat: int) -> dict:
+    results = {}
+    for size in sizes:
+        corpus_dir = os.path.join(_WORKDIR, f"corpus-{size}")
+        os.makedirs(corpus_dir, exist_ok=True)
+        with open(os.path.join(corpus_dir, "grants.jsonl"), "w", encoding="utf-8") as f:
+            for i in range(size):
+                f.write(json.dumps({"title": f"Program {i}", "text": f"Grant {i} funds topic {i % 97} with method {i % 13}."}) + "\n")
+        backend = LocalBackend(corpus_dir)
+        started = time.perf_counter()
+        backend.retrieve("grants", "warm up", n=1)
+        build_s = time.perf_counter() - started
+        samples = []
+        for i in range(max(5, repeat * 10)):
+            started = time.perf_counter()
+            backend.retrieve("grants", f"topic {i % 97} method {i % 13}", n=5)
+            samples.append(time.perf_counter() - started)
+        results[str(size)] = {"build_s": round(build_s, 3), "query": _summary(samples)}
+    return results
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+def bench_kb_hedge(kb: StubKBClient, calls: int) -> dict:
+    results = {}
+    for hedge in (False, True):
+        backend = BedrockBackend(client=kb, hedge=hedge)
+        # KB_HEDGE_MIN_MS guards real Bedrock latencies; scale it to the stub's
+        # so the threshold tracks the p95 and hedges actually fire
+        backend.hedge_min_s = min(backend.hedge_min_s, kb.latency.median)
+        for i in range(30):  # fill the latency window the hedge threshold comes from
+            backend.retrieve("grants", f"warm-up {i}", 5)
+        backend.stats = dict.fromkeys(backend.stats, 0)
+        kb.stats.reset()
+
+        def timed(i):
+            started = time.perf_counter()
+            backend.retrieve("collaborators", f"query {i}", 5)
+            return time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            samples = sorted(pool.map(timed, range(calls)))
+        results["hedged" if hedge else "plain"] = {
+            **_summary(samples),
+            "p99_ms": round(samples[min(len(samples) - 1, int(0.99 * len(samples)))] * 1000, 2),
+            "kb_calls": kb.stats.calls,
+            **({
+                "threshold_ms": round(backend.hedge_threshold() * 1000, 1),
+                "min_ms": round(backend.hedge_min_s * 1000, 1),
+                **backend.stats,
+            } if hedge else {}),
+        }
+    return results
+
+
+# Intake-form edits applied to _CV between the first run and each re-run
+_EDITS = {
+    "interests": ("neural operators, turbulence modelling", "reduced-order models for climate"),
+    "career_stage": ("Mid Career (4–10 yrs)", "Senior (10+ yrs)"),
+}
+
+
+def bench_rerun(kb: StubKBClient, repeat: int) -> dict:
+    results = {}
+    for mode in ("pipeline", "parallel"):
+        samples: dict[str, list] = {}
+        for _ in range(repeat):
+            _reset_caches()
+            for edit, (old, new) in [("first_run", ("", "")), *_EDITS.items()]:
+                kb.stats.reset()
+                started = time.perf_counter()
+                result = agents.run_agent(_CV.replace(old, new), callback=lambda **kwargs: None, mode=mode,
+                                          force_refresh=True)
+                reused = [s["name"] for s in result["_trace"]["spans"]
+                          if s["kind"] == "stage" and s.get("cache") == "memory"]
+                samples.setdefault(edit, []).append((time.perf_counter() - started, kb.stats.calls, reused))
+        results[mode] = {
+            edit: {
+                **_summary([latency for latency, _, _ in runs]),
+                "kb_calls": statistics.median(calls for _, calls, _ in runs),
+                "stages_reused": runs[-1][2],
+            }
+            for edit, runs in samples.items()
+        }
+    return results
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+CASES = ["run_agent", "fanout", "parse", "pdf", "matcher", "local_kb", "kb_hedge", "rerun"]
+
+
+def run(args) -> dict:
+    kb_latency = Latency.parse(args.kb_latency, seed=args.seed)
+    ttft = Latency.parse(args.model_ttft, seed=args.seed)
+    embed_latency = Latency.parse(args.embed_latency, seed=args.seed)
+    kb = StubKBClient(kb_latency)
+    model = StubModel(canned_report(), ttft, tokens_per_s=args.model_tps, replies={
+        agents.SELECT_SYSTEM_PROMPT: canned_selection(),
+        agents.DRAFT_SYSTEM_PROMPT: canned_draft(),
+    })
+    runtime = StubBedrockRuntime(embed_latency, dimensions=demo.EMBED_DIMENSIONS)
+
+    sizes = [100, 1000] if args.quick else [100, 1000, 10000]
+    pages = [2, 10] if args.quick else [2, 10, 40]
+    cases = args.cases or CASES
+
+    results = {}
+    # demo.py prints a line per embedding; keep stdout clean for the JSON report
+    with install(kb_client=kb, model=model, runtime=runtime), open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(devnull):
+        for case in cases:
+            started = time.perf_counter()
+            if case == "run_agent":
+                results[case] = bench_run_agent(kb, model, args.repeat)
+            elif case == "fanout":
+                results[case] = bench_fanout(kb, args.repeat)
+            elif case == "parse":
+                results[case] = bench_parse(args.repeat)
+            elif case == "pdf":
+                results[case] = bench_pdf(pages, args.repeat)
+            elif case == "matcher":
+                results[case] = bench_matcher(runtime, sizes, args.repeat)
+            elif case == "local_kb":
+                results[case] = bench_local_kb(sizes, args.repeat)
+            elif case == "kb_hedge":
+                results[case] = bench_kb_hedge(kb, 100 if args.quick else 400)
+            elif case == "rerun":
+                results[case] = bench_rerun(kb, args.repeat)
+            print(f"{case}: {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    return {
+        "benchmark": "e2e_offline",
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "repeat": args.repeat,
+        "stubs": {
+            "kb_latency": kb_latency.as_dict(),
+            "model_ttft": ttft.as_dict(),
+            "model_tokens_per_s": args.model_tps,
+            "embed_latency": embed_latency.as_dict(),
+        },
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="samples per measurement")
+    parser.add_argument("--quick", action="store_true", help="smaller corpora and PDFs")
+    parser.add_argument("--cases", nargs="+", choices=CASES, help="run only these cases")
+    parser.add_argument("--kb-latency", default="120:400", help="KB retrieve latency, median_ms[:p95_ms]")
+    parser.add_argument("--model-ttft", default="600:1500", help="model time to first token, median_ms[:p95_ms]")
+    parser.add_argument("--model-tps", type=float, default=400, help="model output tokens/s (0 = instant)")
+    parser.add_argument("--embed-latency", default="20:60", help="Titan embedding latency, median_ms[:p95_ms]")
+    parser.add_argument("--seed", type=int, default=0, help="seed for latency sampling")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
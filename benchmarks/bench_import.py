@@ -0,0 +1,80 @@
+"""
+Import-time benchmark for the modules on FundingForge's startup path.
+
+Each module is imported in a fresh interpreter several times; the median
+wall time and the slowest transitive imports (from `python -X importtime`)
+are reported as JSON so results can be tracked across commits.
+
+    python -m benchmarks.bench_import [--repeat 5] [--output import.json]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What the intake page needs vs. what the agent stack pulls in
+MODULES = ["streamlit", "pypdf", "agents"]
+
+
+def _time_import(module: str) -> float:
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def _slowest_imports(module: str, top: int) -> list[dict]:
+    """Parse `-X importtime` output (microseconds) into the top cumulative entries."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append({
+            "module": name.strip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:top]
+
+
+def run(repeat: int = 5, top: int = 10) -> dict:
+    results = {}
+    for module in MODULES:
+        samples = [_time_import(module) for _ in range(repeat)]
+        results[module] = {
+            "median_ms": round(statistics.median(samples) * 1000, 1),
+            "min_ms": round(min(samples) * 1000, 1),
+            "max_ms": round(max(samples) * 1000, 1),
+            "slowest_imports": _slowest_imports(module, top),
+        }
+    return {"benchmark": "import_time", "python": sys.version.split()[0], "repeat": repeat, "modules": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--top", type=int, default=10, help="slowest transitive imports to list")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    report = json.dumps(run(args.repeat, args.top), indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+Local stand-ins for the AWS services FundingForge calls, for offline benchmarks.
+
+Every stub sleeps for a latency drawn from a configurable distribution and
+returns canned but realistically sized responses, so timings reflect
+FundingForge's own overhead plus whatever service latency is dialled in.
+"""
+import io
+import copy
+import json
+import math
+import random
+import asyncio
+import hashlib
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from strands.models.model import Model
+
+
+# ---------------------------------------------------------------------------
+# Latency distributions
+# ---------------------------------------------------------------------------
+
+class Latency:
+    """Log-normal latency with the given median and 95th percentile (seconds)."""
+
+    def __init__(self, median: float, p95: float | None = None, seed: int | None = None):
+        self.median = median
+        self.sigma = math.log(p95 / median) / 1.645 if p95 and median and p95 > median else 0.0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: str, seed: int | None = None) -> "Latency":
+        """Parse "median_ms[:p95_ms]", e.g. "150:400"."""
+        median, _, p95 = spec.partition(":")
+        return cls(float(median) / 1000, float(p95) / 1000 if p95 else None, seed)
+
+    def sample(self) -> float:
+        if self.median <= 0:
+            return 0.0
+        with self._lock:
+            return self._rng.lognormvariate(math.log(self.median), self.sigma)
+
+    def as_dict(self) -> dict:
+        p95 = self.median * math.exp(1.645 * self.sigma)
+        return {"median_ms": round(self.median * 1000, 1), "p95_ms": round(p95 * 1000, 1)}
+
+
+class _Concurrency:
+    """Counts calls and the most that were ever in flight at once."""
+
+    def __init__(self):
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def track(self):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = self.max_in_flight = 0
+
+
+# ---------------------------------------------------------------------------
+# Canned content
+# ---------------------------------------------------------------------------
+
+_AGENCIES = ["NSF", "NIH", "DOE"]
+_LOREM = (
+    "The project combines machine learning with large-scale experimental data to accelerate discovery, "
+    "building shared infrastructure, training the next generation of researchers and broadening participation. "
+)
+
+
+def canned_report(n_matches: int = 3, pad: int = 1) -> str:
+    """A FundingForge JSON report; `pad` multiplies the length of the long text fields."""
+    matches = [
+        {
+            "grant_title": f"Interdisciplinary Research in AI and Physical Systems {i + 1}",
+            "grant_agency": _AGENCIES[i % len(_AGENCIES)],
+            "grant_match_score": 90 - 5 * i,
+            "grant_justification": _LOREM * pad,
+            "collaborator_name": f"Dr. Jane Doe {i + 1}",
+            "collaborator_department": "Department of Mechanical Engineering, Example University",
+            "collaborator_synergy_score": 88 - 3 * i,
+            "collaborator_justification": _LOREM * pad,
+            "draft_proposal": _LOREM * 2 * pad,
+            "draft_email": f"Subject: Collaboration on grant {i + 1}\n\nDear Dr. Doe,\n\n{_LOREM * pad}\n\nBest regards,\nDr. Smith",
+        }
+        for i in range(n_matches)
+    ]
+    return json.dumps({
+        "researcher_summary": "- Machine learning for fluid dynamics\n- Neural operators\n- Symbolic regression",
+        "matches": matches,
+    }, indent=2)
+
+
+def canned_selection(n_matches: int = 3) -> str:
+    """The selection-only JSON written first in parallel synthesis mode."""
+    report = json.loads(canned_report(n_matches))
+    keep = ("grant_title", "grant_agency", "grant_match_score",
+            "collaborator_name", "collaborator_department", "collaborator_synergy_score")
+    report["matches"] = [
+        {"grant_result": i + 1, **{k: m[k] for k in keep}} for i, m in enumerate(report["matches"])
+    ]
+    return json.dumps(report, indent=2)
+
+
+def canned_draft(pad: int = 1) -> str:
+    """One match's text fields, as written by a parallel-mode draft call."""
+    match = json.loads(canned_report(1, pad))["matches"][0]
+    return json.dumps({k: match[k] for k in (
+        "grant_justification", "collaborator_justification", "draft_proposal", "draft_email",
+    )}, indent=2)
+
+
+def _kb_chunk(kb_id: str, i: int) -> str:
+    agency = _AGENCIES[i % len(_AGENCIES)]
+    return (
+        f"[{kb_id}] Result {i}: {agency} program on AI-driven modelling of complex physical systems. "
+        + _LOREM * 3
+    )
+
+
+def synthetic_pdf(pages: int, lines_per_page: int = 45) -> bytes:
+    """A minimal valid PDF with `pages` pages of CV-like Helvetica text."""
+    objs = [b"<</Type/Catalog/Pages 2 0 R>>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(pages))
+    objs.append(f"<</Type/Pages/Kids[{kids}]/Count {pages}>>".encode())
+    font = 3 + 2 * pages
+    for p in range(pages):
+        lines = [f"[{p * lines_per_page + j + 1}] Doe J, Smith A. Neural operators for turbulence. J Fluid Mech {2000 + j % 25}."
+                 for j in range(lines_per_page)]
+        content = "BT /F1 9 Tf 40 760 Td 14 TL " + " ".join(f"({line}) '" for line in lines) + " ET"
+        objs.append(f"<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]/Contents {4 + 2 * p} 0 R"
+                    f"/Resources<</Font<</F1 {font} 0 R>>>>>>".encode())
+        objs.append(f"<</Length {len(content)}>>stream\n{content}\nendstream".encode())
+    objs.append(b"<</Type/Font/Subtype/Type1/BaseFont/Helvetica>>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for n, obj in enumerate(objs, 1):
+        offsets.append(len(out))
+        out += f"{n} 0 obj".encode() + obj + b"endobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{o:010d} 00000 n \n".encode() for o in offsets)
+    out += f"trailer<</Size {len(objs) + 1}/Root 1 0 R>>\nstartxref\n{xref}\n%%EOF".encode()
+    return bytes(out)
+
+
+# ---------------------------------------------------------------------------
+# Service stubs
+# ---------------------------------------------------------------------------
+
+class StubKBClient:
+    """Stands in for the bedrock-agent-runtime client's `retrieve`."""
+
+    def __init__(self, latency: Latency):
+        self.latency = latency
+        self.stats = _Concurrency()
+
+    def retrieve(self, knowledgeBaseId, retrievalQuery, retrievalConfiguration, **kwargs):
+        n = retrievalConfiguration["vectorSearchConfiguration"]["numberOfResults"]
+        with self.stats.track():
+            threading.Event().wait(self.latency.sample())
+        return {"retrievalResults": [
+            {"content": {"text": _kb_chunk(knowledgeBaseId, i)}, "score": 1.0 - i / 10} for i in range(n)
+        ]}
+
+
+class StubModel(Model):
+    """
+    Strands model that replays FundingForge's usual tool sequence, then
+    streams `report` as text: grants first, then collaborators and policies
+    in one turn, then the JSON report. Without tools it answers directly,
+    with `replies[system_prompt]` when given. Each turn waits a
+    time-to-first-token sample, then streams at `tokens_per_s` (0 = instantly).
+    """
+
+    _PLAN = [
+        [("search_grant_opportunities", {"researcher_strengths": "machine learning, fluid dynamics"})],
+        [
+            ("search_collaborators_for_grants", {"grant_specific_queries": [f"ML for grant {i}" for i in range(1, 4)]}),
+            ("search_institutional_policies", {"grant_and_proposal_keywords": "NSF NIH budget compliance"}),
+        ],
+    ]
+
+    def __init__(self, report: str, ttft: Latency, tokens_per_s: float = 0.0, replies: dict | None = None,
+                 model_id: str = "stub"):
+        self.report = report
+        self.model_id = model_id
+        self.replies = replies or {}
+        self.ttft = ttft
+        self.tokens_per_s = tokens_per_s
+        self.stats = _Concurrency()
+        self._cached_prefixes: set[str] = set()
+        self._cache_lock = threading.Lock()
+
+    def update_config(self, **model_config) -> None:
+        pass
+
+    def get_config(self) -> dict:
+        return {"model_id": self.model_id}
+
+    def for_model(self, model_id: str) -> "StubModel":
+        """A view of this stub serving `model_id`: shared stats and prompt cache, keyed per model like Bedrock's."""
+        view = copy.copy(self)
+        view.model_id = model_id
+        return view
+
+    async def structured_output(self, output_model, prompt, system_prompt=None, **kwargs):
+        """Yield the canned reply for `system_prompt`, validated as `output_model`."""
+        with self.stats.track():
+            await asyncio.sleep(self.ttft.sample())
+            text = self.replies.get(system_prompt, self.report)
+            try:
+                output = output_model.model_validate_json(text)
+            except ValueError as e:
+                raise TypeError(
+                    f"StubModel has no canned {output_model.__name__} reply for this system prompt: {e}"
+                ) from e
+            yield {"output": output}
+
+    def _prompt_cache(self, messages, tool_specs, system_prompt) -> int:
+        """
+        Mimic Bedrock prompt caching: the system prompt, tool specs and the
+        first user message up to its cachePoint form a prefix that is written
+        on first sight and read afterwards. Returns its size in tokens,
+        negative when written.
+        """
+        prefix = [self.model_id, system_prompt or "", json.dumps(tool_specs or [], sort_keys=True)]
+        for block in messages[0]["content"] if messages else []:
+            if "cachePoint" in block:
+                break
+            prefix.append(json.dumps(block, sort_keys=True, default=str))
+        key = hashlib.sha256("\0".join(prefix).encode("utf-8")).hexdigest()
+        tokens = sum(map(len, prefix[1:])) // 4
+        with self._cache_lock:
+            if key in self._cached_prefixes:
+                return tokens
+            self._cached_prefixes.add(key)
+        return -tokens
+
+    async def stream(self, messages, tool_specs=None, system_prompt=None, **kwargs):
+        with self.stats.track():
+            await asyncio.sleep(self.ttft.sample())
+            input_chars = len(system_prompt or "") + len(json.dumps(messages, default=str))
+            yield {"messageStart": {"role": "assistant"}}
+
+            available = {spec["name"] for spec in tool_specs or []}
+            turn = sum(1 for m in messages if m["role"] == "assistant")
+            calls = [c for c in self._PLAN[turn] if c[0] in available] if turn < len(self._PLAN) else []
+            if calls:
+                for i, (name, tool_input) in enumerate(calls):
+                    yield {"contentBlockStart": {"start": {"toolUse": {"toolUseId": f"stub-{turn}-{i}", "name": name}}}}
+                    yield {"contentBlockDelta": {"delta": {"toolUse": {"input": json.dumps(tool_input)}}}}
+                    yield {"contentBlockStop": {}}
+                output_chars, stop_reason = len(json.dumps(calls)), "tool_use"
+            else:
+                text = self.replies.get(system_prompt, self.report)
+                for start in range(0, len(text), 64):
+                    piece = text[start:start + 64]
+                    if self.tokens_per_s:
+                        await asyncio.sleep(len(piece) / 4 / self.tokens_per_s)
+                    yield {"contentBlockDelta": {"delta": {"text": piece}}}
+                yield {"contentBlockStop": {}}
+                output_chars, stop_reason = len(text), "end_turn"
+
+            yield {"messageStop": {"stopReason": stop_reason}}
+            cached = self._prompt_cache(messages, tool_specs, system_prompt)
+            usage = {
+                "inputTokens": max(0, input_chars // 4 - abs(cached)),
+                "outputTokens": output_chars // 4,
+                "cacheReadInputTokens": max(cached, 0),
+                "cacheWriteInputTokens": max(-cached, 0),
+            }
+            usage["totalTokens"] = sum(usage.values())
+            yield {"metadata": {"usage": usage, "metrics": {"latencyMs": 0}}}
+
+
+class StubBedrockRuntime:
+    """Stands in for demo.py's bedrock-runtime client: Titan embeddings and Claude messages."""
+
+    def __init__(self, latency: Latency, dimensions: int = 256):
+        self.latency = latency
+        self.dimensions = dimensions
+        self.stats = _Concurrency()
+
+    def invoke_model(self, body, modelId, **kwargs):
+        request = json.loads(body)
+        with self.stats.track():
+            threading.Event().wait(self.latency.sample())
+        if "inputText" in request:
+            seed = int.from_bytes(hashlib.sha256(request["inputText"].encode("utf-8")).digest()[:8], "little")
+            vector = np.random.default_rng(seed).standard_normal(request.get("dimensions", self.dimensions))
+            payload = {"embedding": (vector / np.linalg.norm(vector)).tolist()}
+        else:
+            payload = {"content": [{"type": "text", "text": _LOREM}]}
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+
+# ---------------------------------------------------------------------------
+# Installation
+# ---------------------------------------------------------------------------
+
+@contextmanager
+def install(kb_client=None, model=None, runtime=None):
+    """Swap the stubs into agents.py and demo.py for the enclosed block."""
+    import demo
+    import agents
+    from retrieval import BedrockBackend
+
+    saved = (agents._backend, agents._get_model, demo.bedrock)
+    if kb_client is not None:
+        agents._backend = BedrockBackend(client=kb_client)
+    if model is not None:
+        agents._get_model = lambda model_id=agents.MODEL_ID, *args, **kwargs: model.for_model(model_id)
+    if runtime is not None:
+        demo.bedrock = runtime
+    try:
+        yield
+    finally:
+        agents._backend, agents._get_model, demo.bedrock = saved
@@ -0,0 +1,206 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+# ---------------------------------------------------------------------------
+# Shared cache location
+# ---------------------------------------------------------------------------
+CACHE_DIR = os.getenv("FUNDINGFORGE_CACHE_DIR", ".cache")
+
+
+def content_key(*parts) -> str:
+    """Stable SHA-256 key over the repr of every part (model id, flags, text…)."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(repr(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Counters
+# ---------------------------------------------------------------------------
+
+@dataclass
+class CacheStats:
+    """Process-local hit/miss counters plus the latency hits avoided."""
+
+    hits: int = 0
+    misses: int = 0
+    saved_seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record_hit(self, saved: float = 0.0) -> None:
+        with self._lock:
+            self.hits += 1
+            self.saved_seconds += saved
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def as_dict(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+        }
+
+
+# ---------------------------------------------------------------------------
+# In-process LRU store
+# ---------------------------------------------------------------------------
+
+class TTLCache:
+    """Thread-safe in-memory LRU with optional per-entry expiry (seconds)."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] < time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.stats.record_miss()
+                return None
+            self._entries.move_to_end(key)
+        self.stats.record_hit(entry[2])
+        return entry[0]
+
+    def set(self, key, value, ttl: float | None = None, cost: float = 0.0) -> None:
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires, cost)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# ---------------------------------------------------------------------------
+# SQLite-backed LRU store
+# ---------------------------------------------------------------------------
+
+class DiskCache:
+    """
+    Size-bounded, least-recently-used byte store in a single SQLite file.
+
+    SQLite's WAL mode and busy timeout make it safe to share one file between
+    threads and processes. Each entry remembers how long it took to compute,
+    so a hit can report the latency it saved, and may carry an expiry time.
+
+    Writes keep a running estimate of the file's payload bytes instead of
+    summing the table each time. The exact size is checked (and expired
+    entries purged) only when the estimate passes max_bytes, or every
+    EXACT_CHECK_EVERY writes to pick up other processes' writes. Eviction
+    then frees down to EVICT_TO of max_bytes, so a full cache does not
+    re-check on every write.
+    """
+
+    EXACT_CHECK_EVERY = 64
+    EVICT_TO = 0.9
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._local = threading.local()
+        self._size_lock = threading.Lock()
+        self._approx_bytes: int | None = None  # unknown until the first exact check
+        self._writes = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,"
+            " cost REAL NOT NULL DEFAULT 0, atime REAL NOT NULL, expires REAL)"
+        )
+        try:
+            conn.execute("ALTER TABLE entries ADD COLUMN expires REAL")
+        except sqlite3.OperationalError:
+            pass  # column already present
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_atime ON entries (atime)")
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> bytes | None:
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute("SELECT value, cost, expires FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is not None and row[2] is not None and row[2] < now:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            row = None
+        if row is None:
+            self.stats.record_miss()
+            return None
+        conn.execute("UPDATE entries SET atime = ? WHERE key = ?", (now, key))
+        self.stats.record_hit(row[1])
+        return bytes(row[0])
+
+    def set(self, key: str, value: bytes, cost: float = 0.0, ttl: float | None = None) -> None:
+        """Store `value`; `cost` is the seconds it took to compute, `ttl` its lifetime."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, size, cost, atime, expires) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, sqlite3.Binary(value), len(value), cost, now, now + ttl if ttl else None),
+        )
+        with self._size_lock:
+            self._writes += 1
+            if self._approx_bytes is not None:
+                self._approx_bytes += len(value)  # overcounts replaced keys, which only checks sooner
+            check = (
+                self._approx_bytes is None
+                or self._approx_bytes > self.max_bytes
+                or self._writes % self.EXACT_CHECK_EVERY == 0
+            )
+        if check:
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        conn.execute("DELETE FROM entries WHERE expires IS NOT NULL AND expires < ?", (time.time(),))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total > self.max_bytes:
+            total -= self._evict_lru(conn, total - int(self.max_bytes * self.EVICT_TO))
+        with self._size_lock:
+            self._approx_bytes = total
+
+    def _evict_lru(self, conn: sqlite3.Connection, excess: int) -> int:
+        """Drop least-recently-used entries until `excess` bytes are freed; return the bytes freed."""
+        freed = 0
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY atime"):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany("DELETE FROM entries WHERE key = ?", stale)
+        return freed
+
+    def clear(self) -> None:
+        self._conn().execute("DELETE FROM entries")
+        with self._size_lock:
+            self._approx_bytes = 0
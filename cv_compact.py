@@ -0,0 +1,241 @@
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+
+from cv_intake import CV_MARKER, split_profile
+
+# ---------------------------------------------------------------------------
+# Budget
+# ---------------------------------------------------------------------------
+CV_TOKEN_BUDGET = int(os.getenv("CV_TOKEN_BUDGET", 6000))  # 0 disables compaction
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English prose)."""
+    return (len(text) + 3) // 4
+
+
+# ---------------------------------------------------------------------------
+# Section detection
+# ---------------------------------------------------------------------------
+
+# Canonical section -> heading keywords, matched as whole words (plurals
+# included). Order matters: first match wins.
+_SECTION_KEYWORDS = [
+    ("publications", ("publication", "journal article", "conference paper", "proceedings", "book chapter",
+                      "peer-reviewed", "peer reviewed", "manuscript", "preprint", "patent")),
+    ("presentations", ("presentation", "invited talk", "talk", "seminar", "poster", "abstract")),
+    ("grants", ("grant", "funding", "fellowship", "award", "honor", "honour", "support")),
+    ("education", ("education", "degree", "training")),
+    ("experience", ("experience", "employment", "appointment", "position")),
+    ("skills", ("skill", "expertise", "language")),
+    ("interests", ("research interest", "research statement", "research focus", "summary", "profile")),
+    ("teaching", ("teaching", "course", "mentor", "mentoring", "mentorship", "supervision", "advising")),
+    ("service", ("service", "committee", "review", "reviewing", "editorial", "membership",
+                 "professional activity", "professional activities")),
+]
+_SECTION_PATTERNS = [
+    (section, re.compile(r"\b(?:" + "|".join(map(re.escape, keywords)) + r")(?:s|es)?\b"))
+    for section, keywords in _SECTION_KEYWORDS
+]
+
+# A heading names a section in a few words: connectives don't count towards
+# the limit, and sentence punctuation means the line is prose, not a heading
+_HEADING_MAX_WORDS = 4
+_HEADING_CONNECTIVES = {"and", "&", "of", "the", "in", "for", "to", "or", "/"}
+_SENTENCE_PUNCTUATION = re.compile(r"[.;!?]")
+
+# Sections that carry matching signal and are never summarized
+_PROTECTED = {"header", "interests", "education", "grants", "skills", "experience"}
+# Sections reduced first, in this order, when over budget
+_REDUCIBLE = ["presentations", "publications", "service", "teaching"]
+
+_ENTRY_START = re.compile(r"^\s*(?:\[?\d{1,3}[.)\]]|[-•*▪◦]|\(?(?:19|20)\d{2}\)?[\s.,:-])")
+_YEAR = re.compile(r"\b(?:19|20)\d{2}\b")
+_WORD = re.compile(r"[A-Za-z][A-Za-z-]{3,}")
+_VENUE = re.compile(r"(?:In|in)?\s*(?:Proc(?:eedings)?\.?\s+of\s+(?:the\s+)?)?([A-Z][A-Za-z&.]+(?:\s+[A-Z][A-Za-z&.]+){0,5})\s*,?\s*(?:vol|\d)")
+
+
+def _heading_section(line: str) -> str | None:
+    """Return the canonical section if `line` looks like a CV heading."""
+    stripped = line.strip().strip(":").strip()
+    if not stripped or len(stripped) > 60 or _SENTENCE_PUNCTUATION.search(stripped):
+        return None
+    words = [w for w in stripped.split() if w.lower() not in _HEADING_CONNECTIVES]
+    if not words or len(words) > _HEADING_MAX_WORDS:
+        return None
+    is_heading_case = stripped.isupper() or all(w[0].isupper() or not w[0].isalpha() for w in words)
+    if not is_heading_case:
+        return None
+    lower = stripped.lower()
+    for section, pattern in _SECTION_PATTERNS:
+        if pattern.search(lower):
+            return section
+    return None
+
+
+@dataclass
+class _Section:
+    name: str
+    heading: str
+    lines: list[str] = field(default_factory=list)
+    entries: list[str] | None = None  # original entries, captured on first cap
+
+    def text(self) -> str:
+        body = "\n".join(self.lines)
+        return f"{self.heading}\n{body}" if self.heading else body
+
+
+def split_sections(cv: str) -> list[_Section]:
+    """Split CV text into sections at detected headings; text before the first is "header"."""
+    sections = [_Section("header", "")]
+    for line in cv.splitlines():
+        name = _heading_section(line)
+        if name:
+            sections.append(_Section(name, line.strip()))
+        else:
+            sections[-1].lines.append(line)
+    return sections
+
+
+# ---------------------------------------------------------------------------
+# Reduction steps
+# ---------------------------------------------------------------------------
+
+def _entries(lines: list[str]) -> list[str]:
+    """Group wrapped lines into list entries (citations, talks…)."""
+    entries: list[str] = []
+    for line in lines:
+        if not line.strip():
+            continue
+        if not entries or _ENTRY_START.match(line) or entries[-1].rstrip().endswith("."):
+            entries.append(line.strip())
+        else:
+            entries[-1] += " " + line.strip()
+    return entries
+
+
+def _summarize_entries(name: str, dropped: list[str]) -> str:
+    """One-line local summary of the entries that were cut."""
+    years = sorted(int(y) for e in dropped for y in _YEAR.findall(e))
+    venues = Counter(m.group(1).strip() for e in dropped for m in [_VENUE.search(e)] if m)
+    topics = Counter(w.lower() for e in dropped for w in _WORD.findall(e) if not w[0].isupper())
+    parts = [f"[{len(dropped)} further {name} omitted"]
+    if years:
+        parts.append(f"spanning {years[0]}–{years[-1]}")
+    summary = ", ".join(parts)
+    if venues:
+        summary += "; frequent venues: " + ", ".join(v for v, _ in venues.most_common(4))
+    if topics:
+        summary += "; recurring terms: " + ", ".join(t for t, _ in topics.most_common(8))
+    return summary + "]"
+
+
+def _cap_entries(section: _Section, keep: int) -> bool:
+    """Keep the first `keep` entries plus a summary of the rest; False if nothing to cut."""
+    if section.entries is None:
+        section.entries = _entries(section.lines)
+    if len(section.entries) <= keep:
+        return False
+    section.lines = section.entries[:keep] + [_summarize_entries(section.name, section.entries[keep:])]
+    return True
+
+
+def _dedupe_lines(sections: list[_Section]) -> int:
+    """
+    Drop repeated non-trivial lines across the CV; return how many went.
+    Lines in _PROTECTED sections are always kept (and go first, so their
+    repeats elsewhere are the ones dropped).
+    """
+    seen: set[str] = set()
+    removed = 0
+    for section in sorted(sections, key=lambda s: s.name not in _PROTECTED):
+        kept = []
+        for line in section.lines:
+            norm = " ".join(line.lower().split())
+            if len(norm) > 20 and norm in seen and section.name not in _PROTECTED:
+                removed += 1
+                continue
+            seen.add(norm)
+            kept.append(line)
+        section.lines = kept
+    return removed
+
+
+# ---------------------------------------------------------------------------
+# Public entry point
+# ---------------------------------------------------------------------------
+
+@dataclass
+class CompactionReport:
+    text: str
+    original_tokens: int
+    final_tokens: int
+    actions: list[str] = field(default_factory=list)
+
+    @property
+    def removed_tokens(self) -> int:
+        return self.original_tokens - self.final_tokens
+
+    def as_dict(self) -> dict:
+        return {
+            "original_tokens": self.original_tokens,
+            "final_tokens": self.final_tokens,
+            "removed_tokens": self.removed_tokens,
+            "removed_pct": round(100 * self.removed_tokens / self.original_tokens, 1) if self.original_tokens else 0.0,
+            "actions": self.actions,
+        }
+
+
+def compact_cv(cv_text: str, token_budget: int = CV_TOKEN_BUDGET) -> CompactionReport:
+    """
+    Shrink an (enriched) CV to roughly `token_budget` tokens without a model call.
+
+    The intake-form profile is kept verbatim. In the CV body, lines repeating
+    earlier ones are dropped, then long citation-style sections
+    (presentations, publications, service, teaching) are cut to their leading
+    entries with a one-line summary of the rest, at progressively tighter
+    caps. The _PROTECTED sections (header, education, grants, skills,
+    experience, interests) are only touched by the final hard truncation, if
+    the budget still is not met.
+    """
+    original = estimate_tokens(cv_text)
+    if token_budget <= 0 or original <= token_budget:
+        return CompactionReport(cv_text, original, original)
+
+    profile, body = split_profile(cv_text)
+    prefix = f"{profile}\n\n{CV_MARKER}\n" if CV_MARKER in cv_text else ""
+    sections = split_sections(body)
+    report = CompactionReport("", original, original)
+
+    def render() -> str:
+        return prefix + "\n".join(s.text() for s in sections if s.heading or any(l.strip() for l in s.lines))
+
+    removed = _dedupe_lines(sections)
+    if removed:
+        report.actions.append(f"removed {removed} duplicate lines")
+
+    text = render()
+    caps: dict[int, int] = {}
+    for keep in (25, 12, 6, 3, 0):
+        for name in _REDUCIBLE:
+            if estimate_tokens(text) <= token_budget:
+                break
+            for i, section in enumerate(sections):
+                if section.name == name and _cap_entries(section, keep):
+                    caps[i] = keep
+            text = render()
+    for i, keep in caps.items():
+        section = sections[i]
+        report.actions.append(
+            f"summarized {section.heading}: kept {keep} of {len(section.entries)} entries"
+        )
+
+    if estimate_tokens(text) > token_budget:
+        text = text[: token_budget * 4].rstrip() + "\n[CV truncated to fit the prompt budget]"
+        report.actions.append("truncated to token budget")
+
+    report.text = text
+    report.final_tokens = estimate_tokens(text)
+    return report
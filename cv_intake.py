@@ -0,0 +1,169 @@
+import io
+import os
+import sys
+import time
+import types
+import hashlib
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pdf_worker
+from cache import CACHE_DIR, DiskCache, content_key
+
+# ---------------------------------------------------------------------------
+# Extraction limits
+# ---------------------------------------------------------------------------
+MAX_PDF_BYTES = int(os.getenv("CV_MAX_PDF_BYTES", 20 * 1024 * 1024))
+MAX_PDF_PAGES = int(os.getenv("CV_MAX_PDF_PAGES", 60))
+MAX_CV_CHARS = int(os.getenv("CV_MAX_CHARS", 200_000))
+
+# Below this many pages, a process pool costs more than it saves: every page
+# range ships the whole PDF to its worker, which parses it again
+PARALLEL_MIN_PAGES = int(os.getenv("CV_PARALLEL_MIN_PAGES", 16))
+EXTRACT_WORKERS = int(os.getenv("CV_EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+
+_text_cache = DiskCache(
+    os.path.join(CACHE_DIR, "cv_text.sqlite"),
+    max_bytes=int(os.getenv("CV_TEXT_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+)
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+class PdfTooLargeError(ValueError):
+    """The uploaded PDF exceeds MAX_PDF_BYTES."""
+
+
+# ---------------------------------------------------------------------------
+# CV intake helpers – shared by the Streamlit intake stage and batch runs
+# ---------------------------------------------------------------------------
+
+
+def extract_pdf_text(data: bytes) -> str:
+    """
+    Return the concatenated text of a PDF's pages, stripped.
+
+    Results are cached by SHA-256 of the bytes, so re-uploads return
+    instantly. Only the first MAX_PDF_PAGES pages are read and output stops
+    at MAX_CV_CHARS; long documents are split into page ranges and
+    extracted across a process pool.
+    """
+    if len(data) > MAX_PDF_BYTES:
+        raise PdfTooLargeError(
+            f"PDF is {len(data) / 1e6:.1f} MB; the limit is {MAX_PDF_BYTES / 1e6:.0f} MB"
+        )
+
+    key = content_key("cv-text", hashlib.sha256(data).hexdigest(), MAX_PDF_PAGES, MAX_CV_CHARS)
+    cached = _text_cache.get(key)
+    if cached is not None:
+        return cached.decode("utf-8")
+
+    started = time.perf_counter()
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(data))
+    n_pages = min(len(reader.pages), MAX_PDF_PAGES)
+    if n_pages < PARALLEL_MIN_PAGES or EXTRACT_WORKERS < 2:
+        pages = pdf_worker.extract_pages(reader, 0, n_pages, MAX_CV_CHARS)
+    else:
+        step = -(-n_pages // EXTRACT_WORKERS)
+        ranges = [(start, min(start + step, n_pages)) for start in range(0, n_pages, step)]
+        pages = _extract_parallel(data, ranges)
+
+    text = "\n".join(pages).strip()[:MAX_CV_CHARS]
+    _text_cache.set(key, text.encode("utf-8"), cost=time.perf_counter() - started)
+    return text
+
+
+def _extract_parallel(data: bytes, ranges: list[tuple[int, int]]) -> list[str]:
+    """
+    Extract page ranges across the process pool. Each range pickles the
+    whole PDF to its worker and re-parses it there, which is why short PDFs
+    stay in-process (PARALLEL_MIN_PAGES). A worker that dies (OOM,
+    segfault in a PDF library) breaks the whole pool, so it is replaced and
+    the PDF retried once before the error propagates.
+    """
+    for attempt in (1, 2):
+        pool = _get_pool()
+        try:
+            futures = [pool.submit(pdf_worker.extract_range, data, start, stop, MAX_CV_CHARS) for start, stop in ranges]
+            return [page for future in futures for page in future.result()]
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            if attempt == 2:
+                raise
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    # "spawn" so workers never inherit locks held by Streamlit's threads
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=pdf_worker.init_worker,
+            )
+            # Start every worker now, while spawn can't see __main__
+            pool = _pool
+            try:
+                with _main_hidden():
+                    started = [pool.submit(pdf_worker.ready) for _ in range(EXTRACT_WORKERS)]
+                for future in started:
+                    future.result()
+            except BaseException:
+                _pool = None
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+    return _pool
+
+
+@contextmanager
+def _main_hidden():
+    """
+    Spawned workers re-import the parent's __main__ (for batch.py, the whole
+    agent stack) unless it looks like a bare module while they are started.
+    Workers only run pdf_worker functions, which never need it.
+    """
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a broken pool so the next _get_pool builds a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Separator written by enrich_cv between the intake profile and the CV
+CV_MARKER = "--- CV CONTENT ---"
+
+
+def enrich_cv(cv_raw: str, role: str, year: str, interests: str = "") -> str:
+    """Prefix the raw CV text with the intake-form profile the agent expects."""
+    return (
+        f"Researcher Profile from intake form:\n"
+        f"- Role: {role}\n"
+        f"- Career Stage: {year}\n"
+        f"- Stated Research Interests: {interests or 'Not provided'}\n\n"
+        f"{CV_MARKER}\n{cv_raw}"
+    )
+
+
+def split_profile(cv_text: str) -> tuple[str, str]:
+    """Split enriched CV text into (intake profile, CV); the profile is "" for a bare CV."""
+    profile, marker, body = cv_text.partition(CV_MARKER)
+    if not marker:
+        return "", cv_text
+    return profile.strip(), body.lstrip("\n")
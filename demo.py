@@ -1,15 +1,34 @@
-import boto3
 import json
 import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import os
+import time
 
-# Load AWS credentials from the .env file
+# Load AWS credentials from the .env file (before the local imports, which read their settings at import time)
 load_dotenv()
 
-# Initialize the Bedrock client
+from aws_clients import get_client
+from cache import CACHE_DIR, DiskCache, content_key
+from matcher import EmbeddingIndex
+
+# Initialize the Bedrock client (shared, with a tuned pool, retries and timeouts; see aws_clients.py)
 # Ensure you have requested access to Titan Embeddings V2 and Claude 3 Haiku in the AWS Console (us-east-1 or us-west-2)
-bedrock = boto3.client(service_name='bedrock-runtime', region_name=os.getenv('AWS_DEFAULT_REGION', 'us-east-1'))
+bedrock = get_client('bedrock-runtime')
+
+EMBED_MODEL_ID = "amazon.titan-embed-text-v2:0"
+# Model for generate_synergy_analysis; same MODEL_<STAGE> convention as agents.STAGE_MODELS
+SYNERGY_MODEL_ID = os.getenv("MODEL_SYNERGY", "us.anthropic.claude-opus-4-6-v1")
+EMBED_DIMENSIONS = 256 # 256 dimensions is sufficient for our MVP and extremely fast
+EMBED_NORMALIZE = True
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", 8))
+
+# Content-addressed embedding cache shared by every process on this host
+embedding_cache = DiskCache(
+    os.path.join(CACHE_DIR, "embeddings.sqlite"),
+    max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+)
 
 # ================= 1. Prepare Mock Data =================
 FACULTY_DB = [
@@ -39,21 +58,47 @@ GRANTS_DB = [
 # ================= 2. Core AI Tool Functions =================
 
 def get_embedding(text):
-    """Call Amazon Titan to generate text embeddings"""
+    """Call Amazon Titan to generate text embeddings (served from the disk cache when possible)"""
+    key = content_key(EMBED_MODEL_ID, EMBED_DIMENSIONS, EMBED_NORMALIZE, text)
+    cached = embedding_cache.get(key)
+    if cached is not None:
+        return np.frombuffer(cached, dtype=np.float32).copy()
+
     print(f"Embedding: {text[:30]}...")
+    started = time.perf_counter()
     body = json.dumps({
         "inputText": text,
-        "dimensions": 256, # 256 dimensions is sufficient for our MVP and extremely fast
-        "normalize": True
+        "dimensions": EMBED_DIMENSIONS,
+        "normalize": EMBED_NORMALIZE
     })
     response = bedrock.invoke_model(
         body=body, 
-        modelId="amazon.titan-embed-text-v2:0", 
+        modelId=EMBED_MODEL_ID, 
         accept="application/json", 
         contentType="application/json"
     )
     response_body = json.loads(response.get('body').read())
-    return np.array(response_body['embedding'])
+    vector = np.array(response_body['embedding'], dtype=np.float32)
+    embedding_cache.set(key, vector.tobytes(), cost=time.perf_counter() - started)
+    return vector
+
+def embed_many(texts, max_workers=EMBED_CONCURRENCY):
+    """
+    Embed an iterable of texts through a bounded thread pool.
+
+    Vectors are yielded lazily and in input order; at most 2 * max_workers
+    texts are in flight, so arbitrarily large corpora stream through in
+    constant memory. Throttled calls are retried by the client's adaptive
+    retry mode, which paces all workers together.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="embed") as pool:
+        pending = deque()
+        for text in texts:
+            pending.append(pool.submit(get_embedding, text))
+            if len(pending) >= 2 * max_workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
 
 def calculate_similarity(vec1, vec2):
     """Calculate cosine similarity between two vectors"""
@@ -79,12 +124,14 @@ def generate_synergy_analysis(user_query, top_faculty, top_grant):
         "messages": [{"role": "user", "content": prompt}]
     })
     
-    # Using the Haiku model: fast, cost-effective, perfect for Hackathons
+    # A 3-sentence answer: point MODEL_SYNERGY at a small model (e.g. Haiku) for speed
+    started = time.perf_counter()
     response = bedrock.invoke_model(
         body=body, 
-        modelId="us.anthropic.claude-opus-4-6-v1"
+        modelId=SYNERGY_MODEL_ID
     )
     response_body = json.loads(response.get('body').read())
+    print(f"Synergy analysis ({SYNERGY_MODEL_ID}): {time.perf_counter() - started:.2f}s")
     return response_body['content'][0]['text']
 
 # ================= 3. Run Main Flow =================
@@ -96,28 +143,17 @@ if __name__ == "__main__":
     user_input = "I am a PhD student working on a neural operator framework and symbolic regression for multi-physics simulations. My AI models can accelerate complex physical predictions, but I need real-world experimental data to validate my framework."
     print(f"\n[User Input]: {user_input}\n")
     
-    # 1. Vectorize user input
+    # 1. Load the persisted corpus matrices (embedded only on first run or when the corpus changes)
+    index_model = f"{EMBED_MODEL_ID}:{EMBED_DIMENSIONS}"
+    faculty_index = EmbeddingIndex.build("faculty", FACULTY_DB, embed_many, model_id=index_model)
+    grant_index = EmbeddingIndex.build("grants", GRANTS_DB, embed_many, model_id=index_model)
+
+    # 2. Vectorize user input — the only embedding call per query once the index is warm
     user_vector = get_embedding(user_input)
-    
-    # 2. Match the most suitable faculty member
-    best_faculty = None
-    max_faculty_score = -1
-    for faculty in FACULTY_DB:
-        fac_vec = get_embedding(faculty['text_for_embedding'])
-        score = calculate_similarity(user_vector, fac_vec)
-        if score > max_faculty_score:
-            max_faculty_score = score
-            best_faculty = faculty
-            
-    # 3. Match the most suitable grant
-    best_grant = None
-    max_grant_score = -1
-    for grant in GRANTS_DB:
-        grant_vec = get_embedding(grant['text_for_embedding'])
-        score = calculate_similarity(user_vector, grant_vec)
-        if score > max_grant_score:
-            max_grant_score = score
-            best_grant = grant
+
+    # 3. Match the most suitable faculty member and grant with one matrix-vector product each
+    (best_faculty, max_faculty_score), = faculty_index.top_k(user_vector, k=1)
+    (best_grant, max_grant_score), = grant_index.top_k(user_vector, k=1)
 
     print(f"\n✅ Retrieval Complete!")
     print(f"🥇 Matched Faculty: {best_faculty['name']} (Score: {max_faculty_score:.2f})")
@@ -130,4 +166,5 @@ if __name__ == "__main__":
     print("✨ AI Synergy Analysis ✨")
     print("="*50)
     print(analysis)
-    print("="*50)
\ No newline at end of file
+    print("="*50)
+    print(f"Embedding cache: {embedding_cache.stats.as_dict()}")
\ No newline at end of file
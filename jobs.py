@@ -0,0 +1,106 @@
+import os
+import time
+import uuid
+import threading
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import content_key
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+JOB_WORKERS = int(os.getenv("FUNDINGFORGE_JOB_WORKERS", 4))      # concurrent agent runs per process
+JOB_TTL = float(os.getenv("FUNDINGFORGE_JOB_TTL", 3600))         # seconds a finished job stays pollable
+JOB_MAX_FINISHED = int(os.getenv("FUNDINGFORGE_JOB_MAX_FINISHED", 200))
+
+# ---------------------------------------------------------------------------
+# Job records
+# ---------------------------------------------------------------------------
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+@dataclass
+class Job:
+    id: str
+    key: str
+    status: str = QUEUED
+    events: list[dict] = field(default_factory=list)
+    result: dict | None = None
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+class JobRunner:
+    """
+    Process-wide worker pool and job store for agent runs.
+
+    `stream_fn(cv_text, **kwargs)` must yield stream_agent-style event dicts;
+    every event is recorded on the job so any number of UI sessions can poll
+    progress, and the final {"event": "result"} becomes the job's result.
+    Runs are independent of the submitting Streamlit script, so reruns,
+    refreshes and dropped websockets do not cancel them. Identical
+    submissions while a job is queued or running share that job.
+    """
+
+    def __init__(self, stream_fn, max_workers: int = JOB_WORKERS, ttl: float = JOB_TTL,
+                 max_finished: int = JOB_MAX_FINISHED):
+        self._stream_fn = stream_fn
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fundingforge-job")
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self.ttl = ttl
+        self.max_finished = max_finished
+
+    def submit(self, cv_text: str, **kwargs) -> str:
+        """Queue a run and return its job id (an existing one if already in flight)."""
+        key = content_key(cv_text, sorted(kwargs.items()))
+        with self._lock:
+            self._evict()
+            for job in self._jobs.values():
+                if job.key == key and not job.finished:
+                    return job.id
+            job = Job(id=uuid.uuid4().hex[:12], key=key)
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, cv_text, kwargs)
+        return job.id
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: Job, cv_text: str, kwargs: dict) -> None:
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            for event in self._stream_fn(cv_text, **kwargs):
+                if event.get("event") == "result":
+                    job.result = event["value"]
+                else:
+                    job.events.append(event)
+            status = DONE
+        except BaseException as e:
+            job.error = f"{type(e).__name__}: {e}"
+            status = FAILED
+        # finished_at first: _evict sorts finished jobs by it
+        job.finished_at = time.time()
+        job.status = status
+
+    def _evict(self) -> None:
+        """Drop expired finished jobs, then the oldest beyond max_finished. Caller holds the lock."""
+        now = time.time()
+        finished = sorted((j for j in self._jobs.values() if j.finished), key=lambda j: j.finished_at)
+        for i, job in enumerate(finished):
+            if now - job.finished_at > self.ttl or len(finished) - i > self.max_finished:
+                del self._jobs[job.id]
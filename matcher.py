@@ -0,0 +1,138 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+# ---------------------------------------------------------------------------
+# On-disk location of persisted embedding matrices
+# ---------------------------------------------------------------------------
+INDEX_DIR = os.getenv("FUNDINGFORGE_INDEX_DIR", os.path.join(".cache", "index"))
+
+
+def _fingerprint(texts: list[str], model_id: str) -> str:
+    """Hash the corpus texts and embedding model so stale matrices are rebuilt."""
+    h = hashlib.sha256(model_id.encode("utf-8"))
+    for text in texts:
+        h.update(b"\x00")
+        h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Embedding index
+# ---------------------------------------------------------------------------
+
+class EmbeddingIndex:
+    """
+    A corpus of records plus a contiguous float32 matrix of their unit-norm
+    embeddings. Matrices are stored as .npy files and opened memory-mapped,
+    so every worker process on the host shares one page-cached copy.
+    """
+
+    def __init__(self, records: list[dict], matrix: np.ndarray):
+        if len(records) != matrix.shape[0]:
+            raise ValueError(f"{len(records)} records but {matrix.shape[0]} embedding rows")
+        self.records = records
+        self.matrix = matrix
+
+    @classmethod
+    def build(
+        cls,
+        name: str,
+        records: list[dict],
+        embed_many,
+        model_id: str,
+        text_key: str = "text_for_embedding",
+        index_dir: str = INDEX_DIR,
+    ) -> "EmbeddingIndex":
+        """
+        Load the persisted matrix for `name`, embedding the corpus only if it
+        is missing or was built from different texts / a different model.
+
+        Args:
+            name:       File stem for the persisted matrix (e.g. "faculty").
+            records:    Corpus records; each must carry `text_key`.
+            embed_many: Callable mapping a list of texts to an iterable of 1-D
+                        embedding vectors in the same order.
+            model_id:   Embedding model id, part of the staleness fingerprint.
+            text_key:   Record field holding the text to embed.
+            index_dir:  Directory holding `<name>.json` and the
+                        `<name>.<fingerprint>.npy` matrix it points at.
+        """
+        texts = [r[text_key] for r in records]
+        fingerprint = _fingerprint(texts, model_id)
+        meta_path = os.path.join(index_dir, f"{name}.json")
+
+        old_matrix = None
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            old_matrix = os.path.join(index_dir, meta["matrix"])
+            if meta.get("fingerprint") == fingerprint:
+                matrix = np.load(old_matrix, mmap_mode="r")
+                if list(matrix.shape) == meta.get("shape"):
+                    return cls(records, matrix)
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        # Matrix files are named by fingerprint and never rewritten in place:
+        # stream vectors into a temp .npy, rename it to its final name, then
+        # swap the meta file that points at it. The meta rename is the single
+        # atomic switch, so readers see either the old pair or the new one.
+        os.makedirs(index_dir, exist_ok=True)
+        matrix_name = f"{name}.{fingerprint[:16]}.npy"
+        matrix_path = os.path.join(index_dir, matrix_name)
+        tmp_matrix = f"{matrix_path}.{os.getpid()}.tmp.npy"
+        tmp_meta = f"{meta_path}.{os.getpid()}.tmp"
+        matrix = None
+        for i, vec in enumerate(embed_many(texts)):
+            vec = np.asarray(vec, dtype=np.float32)
+            if matrix is None:
+                matrix = np.lib.format.open_memmap(
+                    tmp_matrix, mode="w+", dtype=np.float32, shape=(len(texts), vec.shape[0])
+                )
+            norm = np.linalg.norm(vec)
+            matrix[i] = vec / norm if norm else vec
+        if matrix is None:
+            np.save(tmp_matrix, np.zeros((0, 0), dtype=np.float32))
+            shape = [0, 0]
+        else:
+            matrix.flush()
+            shape = list(matrix.shape)
+            del matrix
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": fingerprint, "model_id": model_id, "shape": shape, "matrix": matrix_name}, f)
+        os.replace(tmp_matrix, matrix_path)
+        os.replace(tmp_meta, meta_path)
+        if old_matrix and os.path.abspath(old_matrix) != os.path.abspath(matrix_path):
+            try:
+                os.remove(old_matrix)  # open memory maps keep their pages until closed
+            except OSError:
+                pass
+
+        return cls(records, np.load(matrix_path, mmap_mode="r"))
+
+    def scores(self, query_vec) -> np.ndarray:
+        """Cosine score of every record against `query_vec`."""
+        if self.matrix.shape[0] == 0:
+            return np.zeros(0, dtype=np.float32)
+        query = np.asarray(query_vec, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        return self.matrix @ query
+
+    def top_k(self, query_vec, k: int = 1) -> list[tuple[dict, float]]:
+        """Return the `k` best (record, cosine score) pairs, highest first."""
+        scores = self.scores(query_vec)
+        return [(self.records[i], float(scores[i])) for i in top_indices(scores, k)]
+
+
+def top_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the `k` highest scores, best first, without a full sort."""
+    n = scores.shape[0]
+    if n == 0:
+        return np.arange(0)
+    k = max(1, min(k, n))
+    idx = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+    return idx[np.argsort(-scores[idx])]
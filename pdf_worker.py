@@ -0,0 +1,36 @@
+"""
+PDF page extraction, importable on its own by process-pool workers.
+
+Kept free of FundingForge's other modules so a spawned worker imports only
+pypdf, never the agent stack.
+"""
+import io
+
+
+def init_worker() -> None:
+    """Pool initializer: import pypdf once per worker, before the first task."""
+    import pypdf  # noqa: F401
+
+
+def ready() -> bool:
+    """No-op task used to start a pool's workers ahead of real work."""
+    return True
+
+
+def extract_pages(reader, start: int, stop: int, max_chars: int) -> list[str]:
+    """Extract pages [start, stop) of an open PdfReader, stopping once `max_chars` are reached."""
+    pages, chars = [], 0
+    for i in range(start, stop):
+        page = reader.pages[i].extract_text() or ""
+        pages.append(page)
+        chars += len(page)
+        if chars >= max_chars:
+            break  # early cut-off: the rest would be truncated anyway
+    return pages
+
+
+def extract_range(data: bytes, start: int, stop: int, max_chars: int) -> list[str]:
+    """Parse `data` and extract pages [start, stop); the pool worker's task."""
+    from pypdf import PdfReader
+
+    return extract_pages(PdfReader(io.BytesIO(data)), start, stop, max_chars)
@@ -0,0 +1,290 @@
+import json
+import math
+
+# ---------------------------------------------------------------------------
+# Report schema
+# ---------------------------------------------------------------------------
+
+# A match missing any of these is dropped; other fields default to ""
+REQUIRED_MATCH_FIELDS = ("grant_title", "grant_agency", "grant_match_score", "collaborator_name")
+TEXT_MATCH_FIELDS = (
+    "grant_justification", "collaborator_department", "collaborator_justification",
+    "draft_proposal", "draft_email",
+)
+SCORE_FIELDS = ("grant_match_score", "collaborator_synergy_score")
+
+# Problem reported for a well-formed report with no matches at all; a repair
+# call cannot fix it, since matches must never be invented
+EMPTY_MATCHES = "matches is empty"
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class ReportParseError(ValueError):
+    """No usable report could be recovered; `problems` says why."""
+
+    def __init__(self, problems: list[str]):
+        super().__init__("; ".join(problems))
+        self.problems = problems
+
+
+# ---------------------------------------------------------------------------
+# Extraction
+# ---------------------------------------------------------------------------
+
+def extract_json_object(text: str) -> tuple[str | None, bool]:
+    """
+    Return the report's top-level {...} span and whether it was cut off.
+
+    One pass tracks brace depth and string state, so braces inside strings,
+    preamble, code fences and trailing commentary are all handled. Among
+    complete top-level objects the first one mentioning "matches" wins,
+    else the longest; an object still open at end of text is returned as
+    truncated when no complete one exists.
+    """
+    objects: list[tuple[int, int]] = []
+    depth, start = 0, -1
+    in_string = escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"' and depth:
+            in_string = True
+        elif ch == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                objects.append((start, i + 1))
+
+    if objects:
+        for s, e in objects:
+            if '"matches"' in text[s:e]:
+                return text[s:e], False
+        s, e = max(objects, key=lambda span: span[1] - span[0])
+        return text[s:e], False
+    if depth:
+        return text[start:], True
+    return None, False
+
+
+# ---------------------------------------------------------------------------
+# Repair
+# ---------------------------------------------------------------------------
+
+def _closes_string(text: str, i: int) -> bool:
+    """Whether the quote at `i` ends a JSON string rather than sitting inside one."""
+    n = len(text)
+    j = i + 1
+    while j < n and text[j] in " \t\r\n":
+        j += 1
+    if j >= n or text[j] in ":}]":
+        return True
+    if text[j] != ",":
+        return False
+    k = j + 1
+    while k < n and text[k] in " \t\r\n":
+        k += 1
+    return k >= n or text[k] in '"{[]}-0123456789'
+
+
+def _strip_trailing_comma(out: list[str]) -> bool:
+    k = len(out) - 1
+    while k >= 0 and out[k] in " \t\r\n":
+        k -= 1
+    if k >= 0 and out[k] == ",":
+        del out[k:]
+        return True
+    return False
+
+
+def repair_json(text: str) -> tuple[str, list[str]]:
+    """
+    Rewrite almost-JSON into JSON in one pass and list what was fixed:
+    stray unescaped quotes and raw control characters inside strings,
+    trailing commas, mismatched closers, and output cut off mid-value
+    (trimmed back to the last complete element, then closed).
+    """
+    out: list[str] = []
+    stack: list[str] = []
+    safe = (0, ())  # (len(out), stack) at the last point a cut leaves valid JSON
+    fixes: list[str] = []
+
+    def fix(what: str) -> None:
+        if what not in fixes:
+            fixes.append(what)
+
+    in_string = escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+                out.append(ch)
+            elif ch == "\\":
+                escape = True
+                out.append(ch)
+            elif ch == '"':
+                if _closes_string(text, i):
+                    in_string = False
+                    out.append(ch)
+                else:
+                    out.append('\\"')
+                    fix("escaped stray quotes")
+            elif ch == "\n":
+                out.append("\\n")
+                fix("escaped raw newlines")
+            elif ord(ch) < 0x20:
+                out.append(f"\\u{ord(ch):04x}")
+                fix("escaped control characters")
+            else:
+                out.append(ch)
+            continue
+
+        if ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch in "{[":
+            stack.append(ch)
+            out.append(ch)
+            safe = (len(out), tuple(stack))
+        elif ch in "}]":
+            if not stack:
+                break
+            if _strip_trailing_comma(out):
+                fix("removed trailing commas")
+            closer = _CLOSERS[stack.pop()]
+            if closer != ch:
+                fix("fixed mismatched brackets")
+            out.append(closer)
+            safe = (len(out), tuple(stack))
+            if not stack:
+                break
+        elif ch == ",":
+            safe = (len(out), tuple(stack))
+            out.append(ch)
+        else:
+            out.append(ch)
+
+    if stack or in_string:
+        cut, open_stack = safe
+        del out[cut:]
+        _strip_trailing_comma(out)
+        out.extend(_CLOSERS[c] for c in reversed(open_stack))
+        fix("closed truncated output")
+    return "".join(out), fixes
+
+
+# ---------------------------------------------------------------------------
+# Validation
+# ---------------------------------------------------------------------------
+
+def _as_score(value) -> int:
+    """A 0–100 int from a number or "85%"-style string; ValueError for anything else, inf and NaN included."""
+    if isinstance(value, str):
+        value = value.strip().rstrip("%")
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError(f"{value} is not a finite score")
+    return min(100, max(0, int(value)))
+
+
+def validate_report(data, text_fields: tuple[str, ...] = TEXT_MATCH_FIELDS) -> tuple[dict, list[str]]:
+    """
+    Check the report structure, coercing what can be coerced.
+
+    Scores become ints clamped to [0, 100], missing `text_fields` become "",
+    and matches lacking a required field are dropped. Returns the cleaned
+    report and the problems found; raises ReportParseError if no usable
+    match remains.
+    """
+    if not isinstance(data, dict):
+        raise ReportParseError([f"top-level value is {type(data).__name__}, not an object"])
+    problems: list[str] = []
+    if not isinstance(data.get("researcher_summary"), str):
+        problems.append("researcher_summary missing")
+        data["researcher_summary"] = ""
+
+    matches = data.get("matches")
+    if not isinstance(matches, list):
+        raise ReportParseError(problems + ["matches is not a list"])
+    if not matches:
+        raise ReportParseError(problems + [EMPTY_MATCHES])
+
+    valid = []
+    for i, match in enumerate(matches, 1):
+        if not isinstance(match, dict):
+            problems.append(f"match {i} is not an object")
+            continue
+        missing = [k for k in REQUIRED_MATCH_FIELDS if match.get(k) in (None, "")]
+        if missing:
+            problems.append(f"match {i} dropped: missing {', '.join(missing)}")
+            continue
+        for key in SCORE_FIELDS:
+            try:
+                match[key] = _as_score(match.get(key, 0))
+            except (TypeError, ValueError):
+                problems.append(f"match {i}: {key} {match.get(key)!r} is not a number")
+                match[key] = 0
+        for key in text_fields:
+            if not isinstance(match.get(key), str):
+                if key in match:
+                    problems.append(f"match {i}: {key} is not text")
+                else:
+                    problems.append(f"match {i}: {key} missing")
+                match[key] = "" if match.get(key) is None else str(match[key])
+        valid.append(match)
+
+    if not valid:
+        raise ReportParseError(problems + ["no usable matches"])
+    data["matches"] = valid
+    return data, problems
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def parse_report(text: str, text_fields: tuple[str, ...] = TEXT_MATCH_FIELDS) -> tuple[dict, list[str]]:
+    """
+    Parse the model's report, repairing it locally if needed.
+
+    Returns (report, notes), where notes lists repairs and schema problems
+    that were worked around. Raises ReportParseError when nothing usable
+    can be recovered.
+    """
+    data, notes = parse_json_object(text)
+    report, problems = validate_report(data, text_fields)
+    return report, notes + problems
+
+
+def parse_json_object(text: str) -> tuple[dict, list[str]]:
+    """Extract and, if needed, repair the JSON object in `text`; returns (value, repairs made)."""
+    # Fast path: the prompts ask for bare JSON, which is what usually comes back
+    stripped = text.strip()
+    if stripped.startswith("{") and stripped.endswith("}"):
+        try:
+            return json.loads(stripped), []
+        except ValueError:
+            pass
+
+    candidate, truncated = extract_json_object(text)
+    if candidate is None:
+        raise ReportParseError(["no JSON object found"])
+
+    if not truncated:
+        try:
+            return json.loads(candidate), []
+        except ValueError:
+            pass
+    repaired, fixes = repair_json(candidate)
+    try:
+        return json.loads(repaired), fixes
+    except ValueError as e:
+        raise ReportParseError(fixes + [f"invalid JSON after repair: {e}"])
@@ -0,0 +1,162 @@
+import os
+import re
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from cache import content_key
+from cv_compact import estimate_tokens
+from retrieval import BM25, HashingEmbedder
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+RERANK_ENABLED = os.getenv("RERANK", "1") != "0"
+RERANK_FETCH = int(os.getenv("RERANK_FETCH", 12))             # candidates fetched per query
+TOOL_TOKEN_BUDGET = int(os.getenv("TOOL_TOKEN_BUDGET", 1500))  # per tool result; 0 = no cap
+
+# Blend of max-normalized BM25, hashed-embedding cosine, and the retriever's own order
+_WEIGHTS = (0.4, 0.3, 0.3)
+# A chunk cut to fit the budget must keep at least this many tokens, else it is dropped
+_MIN_PARTIAL_TOKENS = 60
+
+_embedder = HashingEmbedder(dims=512)
+
+
+# ---------------------------------------------------------------------------
+# Per-run state – which chunks the model has already seen this run
+# ---------------------------------------------------------------------------
+
+@dataclass
+class RunState:
+    seen: set = field(default_factory=set)
+    calls: int = 0
+    duplicates_dropped: int = 0
+    tokens_before: int = 0   # what the top-n raw chunks would have cost
+    tokens_after: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "duplicates_dropped": self.duplicates_dropped,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "tokens_saved": self.tokens_before - self.tokens_after,
+        }
+
+
+_run: ContextVar[RunState | None] = ContextVar("fundingforge_rerank_run", default=None)
+
+
+@contextmanager
+def start_run():
+    """Scope cross-call deduplication and token accounting to the enclosed run."""
+    state = RunState()
+    token = _run.set(state)
+    try:
+        yield state
+    finally:
+        _run.reset(token)
+
+
+# ---------------------------------------------------------------------------
+# Reranking
+# ---------------------------------------------------------------------------
+
+def _fingerprint(chunk: str) -> str:
+    return content_key(" ".join(re.findall(r"\w+", chunk.lower())))
+
+
+def _scores(query: str, chunks: list[str]) -> np.ndarray:
+    lexical = BM25(chunks).scores(query)
+    if lexical.max() > 0:
+        lexical = lexical / lexical.max()
+    q = _embedder.embed(query)
+    semantic = np.array([_embedder.embed(c) @ q for c in chunks], dtype=np.float32)
+    prior = 1.0 - np.arange(len(chunks), dtype=np.float32) / len(chunks)
+    w_lex, w_sem, w_prior = _WEIGHTS
+    return w_lex * lexical + w_sem * semantic + w_prior * prior
+
+
+def rank(query: str, candidates: list[str]) -> list[str]:
+    """
+    `candidates` (retriever order, best first) reordered for `query` by a
+    lexical + hashed-embedding blend. Pure, so results can be cached and
+    ranked concurrently; deduplication happens in select().
+    """
+    if not RERANK_ENABLED or not candidates:
+        return list(candidates)
+    order = np.argsort(-_scores(query, candidates), kind="stable")
+    return [candidates[i] for i in order]
+
+
+def select(ranked: list[str], n: int = 5, token_budget: int = TOOL_TOKEN_BUDGET) -> tuple[list[str], dict]:
+    """
+    Pick up to `n` of `ranked` (best first). Chunks the model already
+    received earlier in this run are skipped, and the selection stops at
+    `token_budget` tokens, cutting the last chunk short when enough room
+    remains. Returns the chunks and this call's counters, which are also
+    added to the current RunState.
+
+    Which call keeps a chunk shared with another depends on call order, so
+    callers that fan out retrieval select the results afterwards, in query
+    order, to get the same context every run.
+    """
+    state = _run.get()
+    baseline = sum(estimate_tokens(c) for c in ranked[:n])
+    if not RERANK_ENABLED:
+        kept, dropped = ranked[:n], 0
+    else:
+        kept, dropped, used, local = [], 0, 0, set()
+        for chunk in ranked:
+            if len(kept) == n:
+                break
+            fp = _fingerprint(chunk)
+            if fp in local or _was_seen(state, fp):
+                dropped += 1
+                continue
+            local.add(fp)
+            cost = estimate_tokens(chunk)
+            if token_budget and used + cost > token_budget:
+                room = token_budget - used
+                if room >= _MIN_PARTIAL_TOKENS:
+                    kept.append(chunk[: room * 4].rstrip() + " […]")
+                else:
+                    local.discard(fp)
+                break
+            kept.append(chunk)
+            used += cost
+
+    stats = {
+        "candidates": len(ranked),
+        "kept": len(kept),
+        "duplicates_dropped": dropped,
+        "tokens_before": baseline,
+        "tokens_after": sum(estimate_tokens(c) for c in kept),
+    }
+    if state is not None:
+        with state._lock:
+            if RERANK_ENABLED:
+                state.seen.update(local)
+            state.calls += 1
+            state.duplicates_dropped += dropped
+            state.tokens_before += stats["tokens_before"]
+            state.tokens_after += stats["tokens_after"]
+    return kept, stats
+
+
+def rerank(query: str, candidates: list[str], n: int = 5,
+           token_budget: int = TOOL_TOKEN_BUDGET) -> tuple[list[str], dict]:
+    """rank() then select(): up to `n` of `candidates` for `query`."""
+    return select(rank(query, candidates), n, token_budget)
+
+
+def _was_seen(state: RunState | None, fp: str) -> bool:
+    if state is None:
+        return False
+    with state._lock:
+        return fp in state.seen
@@ -0,0 +1,309 @@
+import os
+import re
+import json
+import math
+import time
+import zlib
+import threading
+from abc import ABC, abstractmethod
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+import tracing
+from aws_clients import get_client
+from matcher import EmbeddingIndex, top_indices
+
+# Logical Knowledge Base names used by the agent tools
+KB_NAMES = ("grants", "collaborators", "policies")
+
+
+# ---------------------------------------------------------------------------
+# Backend interface
+# ---------------------------------------------------------------------------
+
+class RetrievalBackend(ABC):
+    """Returns the text of the `n` best chunks for a query against one logical KB."""
+
+    name = "base"
+
+    @abstractmethod
+    def retrieve(self, kb: str, query: str, n: int = 5) -> list[str]:
+        ...
+
+    def warm_up(self) -> None:
+        """Open connections / load indexes ahead of the first query."""
+
+
+def from_env() -> RetrievalBackend:
+    """Backend selected by RETRIEVAL_BACKEND: "bedrock" (default) or "local"."""
+    kind = os.getenv("RETRIEVAL_BACKEND", "bedrock")
+    if kind == "bedrock":
+        return BedrockBackend()
+    if kind == "local":
+        return LocalBackend()
+    raise ValueError(f"Unknown RETRIEVAL_BACKEND: {kind!r}")
+
+
+# ---------------------------------------------------------------------------
+# Bedrock Knowledge Bases
+# ---------------------------------------------------------------------------
+
+class _LatencyWindow:
+    """The last `size` call latencies, for percentile-based hedging thresholds."""
+
+    def __init__(self, size: int = 200):
+        self._samples: deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float, min_samples: int = 20) -> float | None:
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            return float(np.quantile(np.fromiter(self._samples, dtype=np.float64), q))
+
+
+class BedrockBackend(RetrievalBackend):
+    """
+    The Bedrock Agent Runtime `retrieve` API, one Knowledge Base per logical KB.
+
+    With hedging on (KB_HEDGE=1), a retrieve still running after the
+    KB_HEDGE_QUANTILE latency of recent calls (KB_HEDGE_DEFAULT_MS until
+    enough calls have been seen, never below KB_HEDGE_MIN_MS) is issued a
+    second time and whichever response arrives first is used.
+    """
+
+    name = "bedrock"
+
+    def __init__(self, client=None, region: str | None = None, kb_ids: dict | None = None,
+                 hedge: bool | None = None):
+        self.client = client or get_client("bedrock-agent-runtime", region)
+        self.kb_ids = kb_ids or {
+            "grants": os.getenv("KB_GRANTS_ID", "KFW7ZEBGMR"),
+            "collaborators": os.getenv("KB_FACULTY_ID", "Q89ZCWQSRY"),
+            "policies": os.getenv("KB_COMPLIANCE_ID", "LULFPOFCTD"),
+        }
+        self.hedge = os.getenv("KB_HEDGE", "0") == "1" if hedge is None else hedge
+        self.hedge_quantile = float(os.getenv("KB_HEDGE_QUANTILE", 0.95))
+        self.hedge_default_s = float(os.getenv("KB_HEDGE_DEFAULT_MS", 1000)) / 1000
+        self.hedge_min_s = float(os.getenv("KB_HEDGE_MIN_MS", 100)) / 1000
+        self.stats = {"calls": 0, "hedged": 0, "hedge_wins": 0}
+        self._latency = _LatencyWindow()
+        self._pool: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def retrieve(self, kb: str, query: str, n: int = 5) -> list[str]:
+        self._count("calls")
+        if not self.hedge:
+            return self._retrieve_once(kb, query, n)
+
+        pool = self._hedge_pool()
+        threshold = self.hedge_threshold()
+        primary = pool.submit(self._retrieve_once, kb, query, n)
+        try:
+            return primary.result(timeout=threshold)
+        except TimeoutError:
+            pass
+
+        self._count("hedged")
+        with tracing.span(kb, "hedge", threshold_ms=round(threshold * 1000, 1)) as span:
+            backup = pool.submit(self._retrieve_once, kb, query, n)
+            for future in as_completed((primary, backup)):
+                if future.exception() is None:
+                    span.attrs["winner"] = "hedge" if future is backup else "primary"
+                    if future is backup:
+                        self._count("hedge_wins")
+                    return future.result()
+            return primary.result()  # both failed: raise the original error
+
+    def _retrieve_once(self, kb: str, query: str, n: int) -> list[str]:
+        started = time.perf_counter()
+        response = self.client.retrieve(
+            knowledgeBaseId=self.kb_ids[kb],
+            retrievalQuery={"text": query},
+            retrievalConfiguration={"vectorSearchConfiguration": {"numberOfResults": n}},
+        )
+        self._latency.add(time.perf_counter() - started)
+        return [r.get("content", {}).get("text", "") for r in response.get("retrievalResults", [])]
+
+    def hedge_threshold(self) -> float:
+        """Seconds to wait on a retrieve before hedging it."""
+        observed = self._latency.quantile(self.hedge_quantile)
+        return max(self.hedge_min_s, self.hedge_default_s if observed is None else observed)
+
+    def _hedge_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=int(os.getenv("KB_HEDGE_WORKERS", 32)), thread_name_prefix="kb-hedge",
+                )
+            return self._pool
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def warm_up(self) -> None:
+        # A one-result query opens a kept-alive TLS connection to the endpoint
+        self._retrieve_once("grants", "research grant", n=1)
+
+
+# ---------------------------------------------------------------------------
+# Local corpora
+# ---------------------------------------------------------------------------
+
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9-]+")
+_STOPWORDS = frozenset(
+    "and are for from has have into its not our that the their this was were which with will".split()
+)
+
+
+def _tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class HashingEmbedder:
+    """
+    Model-free embeddings: unigrams and bigrams feature-hashed into `dims`
+    signed buckets with sublinear term frequency. Deterministic across
+    processes, so matrices persisted by EmbeddingIndex stay valid.
+    """
+
+    def __init__(self, dims: int = 1024):
+        self.dims = dims
+        self.model_id = f"hashing-v1:{dims}"
+
+    def embed(self, text: str) -> np.ndarray:
+        tokens = _tokenize(text)
+        features = Counter(tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])])
+        vec = np.zeros(self.dims, dtype=np.float32)
+        for feature, count in features.items():
+            h = zlib.crc32(feature.encode("utf-8"))
+            vec[h % self.dims] += (1.0 + math.log(count)) * (1 if h & 0x80000000 else -1)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def embed_many(self, texts):
+        for text in texts:
+            yield self.embed(text)
+
+
+class BM25:
+    """Okapi BM25 over an inverted index of per-term (doc ids, weights) arrays."""
+
+    def __init__(self, texts: list[str], k1: float = 1.5, b: float = 0.75):
+        docs = [Counter(_tokenize(t)) for t in texts]
+        self.n = len(docs)
+        lengths = np.array([sum(d.values()) for d in docs], dtype=np.float32)
+        avgdl = float(lengths.mean()) if self.n else 0.0
+        postings: dict[str, tuple[list, list]] = {}
+        for i, doc in enumerate(docs):
+            for term, tf in doc.items():
+                ids, tfs = postings.setdefault(term, ([], []))
+                ids.append(i)
+                tfs.append(tf)
+        self._index = {}
+        for term, (ids, tfs) in postings.items():
+            ids = np.array(ids)
+            tfs = np.array(tfs, dtype=np.float32)
+            idf = math.log(1 + (self.n - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = k1 * (1 - b + b * lengths[ids] / avgdl) if avgdl else k1
+            self._index[term] = (ids, idf * tfs * (k1 + 1) / (tfs + norm))
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.n, dtype=np.float32)
+        for term in set(_tokenize(query)):
+            posting = self._index.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        return scores
+
+
+def _record_text(record) -> str:
+    """Chunk text for a corpus record: its text field, or its fields as "key: value" lines."""
+    if isinstance(record, str):
+        return record
+    for key in ("text", "content", "text_for_embedding"):
+        if isinstance(record.get(key), str):
+            return record[key]
+    return "\n".join(f"{k}: {v}" for k, v in record.items() if v not in (None, "", [], {}))
+
+
+def _load_records(path: str) -> list:
+    if path.endswith(".parquet"):
+        try:
+            import pandas as pd
+        except ImportError as e:
+            raise ImportError("Reading Parquet corpora requires pandas and pyarrow") from e
+        return pd.read_parquet(path).to_dict("records")
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        data = json.load(f)
+    return data if isinstance(data, list) else data.get("records", [])
+
+
+class _LocalKB:
+    def __init__(self, texts: list[str], index: EmbeddingIndex, bm25: BM25 | None):
+        self.texts = texts
+        self.index = index
+        self.bm25 = bm25
+
+
+class LocalBackend(RetrievalBackend):
+    """
+    In-process retrieval over `<corpus_dir>/<kb>.{json,jsonl,parquet}`.
+
+    Each corpus is embedded once with a model-free HashingEmbedder and kept
+    as a memory-mapped EmbeddingIndex; with a BM25 weight above zero the
+    cosine score is blended with the max-normalized BM25 score.
+    Configured by LOCAL_CORPUS_DIR and LOCAL_BM25_WEIGHT (0 disables BM25).
+    """
+
+    name = "local"
+
+    def __init__(self, corpus_dir: str | None = None, embedder=None, bm25_weight: float | None = None):
+        self.corpus_dir = corpus_dir or os.getenv("LOCAL_CORPUS_DIR", os.path.join("data", "corpus"))
+        self.embedder = embedder or HashingEmbedder()
+        self.bm25_weight = float(os.getenv("LOCAL_BM25_WEIGHT", 0.3)) if bm25_weight is None else bm25_weight
+        self._kbs: dict[str, _LocalKB] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, kb: str) -> str:
+        for ext in (".parquet", ".jsonl", ".json"):
+            path = os.path.join(self.corpus_dir, kb + ext)
+            if os.path.exists(path):
+                return path
+        raise FileNotFoundError(f"No corpus for {kb!r} in {self.corpus_dir} (.json, .jsonl or .parquet)")
+
+    def _load(self, kb: str) -> _LocalKB:
+        with self._lock:
+            loaded = self._kbs.get(kb)
+            if loaded is None:
+                texts = [_record_text(r) for r in _load_records(self._path(kb))]
+                index = EmbeddingIndex.build(
+                    f"local-{kb}", [{"text": t} for t in texts], self.embedder.embed_many,
+                    model_id=self.embedder.model_id, text_key="text",
+                )
+                bm25 = BM25(texts) if self.bm25_weight > 0 else None
+                loaded = self._kbs[kb] = _LocalKB(texts, index, bm25)
+        return loaded
+
+    def retrieve(self, kb: str, query: str, n: int = 5) -> list[str]:
+        local = self._load(kb)
+        scores = local.index.scores(self.embedder.embed(query))
+        if local.bm25 is not None and scores.shape[0]:
+            lexical = local.bm25.scores(query)
+            top = lexical.max()
+            if top > 0:
+                scores = (1 - self.bm25_weight) * scores + self.bm25_weight * lexical / top
+        return [local.texts[i] for i in top_indices(scores, n)]
+
+    def warm_up(self) -> None:
+        for kb in KB_NAMES:
+            self._load(kb)
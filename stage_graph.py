@@ -0,0 +1,117 @@
+import time
+from dataclasses import dataclass
+from typing import Callable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import tracing
+from cache import TTLCache, content_key
+
+
+# ---------------------------------------------------------------------------
+# Stages
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One pipeline step, computed as `fn(*inputs)`. Each input names either a
+    seed value passed to StageGraph.run or an earlier stage's output.
+    """
+
+    name: str
+    inputs: tuple[str, ...]
+    fn: Callable
+    memo: bool = True          # False for cheap stages, which recompute rather than take cache space
+    ttl: float | None = None   # seconds a memoized output stays fresh
+
+
+# ---------------------------------------------------------------------------
+# Graph
+# ---------------------------------------------------------------------------
+
+class StageGraph:
+    """
+    A pipeline as a dependency graph of stages with memoized outputs.
+
+    A stage's output is keyed by its name and the values of its inputs,
+    not by whether its upstream stages reran. So when an edit changes one
+    seed, only stages whose inputs actually came out different execute
+    again, and everything downstream of an unchanged value is served from
+    the memo. Each stage starts as soon as its inputs are ready, and
+    independent branches run concurrently. Stage outputs must not be None.
+    """
+
+    def __init__(self, stages: list[Stage], max_entries: int = 256, workers: int = 4):
+        self.stages: dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage: {stage.name!r}")
+            self.stages[stage.name] = stage
+        self.workers = workers
+        self._memo = TTLCache(max_entries=max_entries)
+
+    @property
+    def stats(self):
+        """Hit/miss counters of the stage memo."""
+        return self._memo.stats
+
+    def clear(self) -> None:
+        self._memo.clear()
+
+    def run(self, seeds: dict, targets: tuple[str, ...], on_start: Callable[[str], None] | None = None) -> dict:
+        """
+        Compute `targets` (and the stages they depend on) from `seeds`.
+        `on_start(stage_name)` is called from the calling thread as each
+        stage is scheduled. Returns {target: output}.
+        """
+        pending = self._plan(targets, seeds)
+        values = dict(seeds)
+        running: dict = {}
+        run_stage = tracing.bind(self._run_stage)
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="stage") as pool:
+            while pending or running:
+                for stage in [s for s in pending if all(i in values for i in s.inputs)]:
+                    pending.remove(stage)
+                    if on_start is not None:
+                        on_start(stage.name)
+                    running[pool.submit(run_stage, stage, [values[i] for i in stage.inputs])] = stage
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    values[running.pop(future).name] = future.result()
+        return {name: values[name] for name in targets}
+
+    def _plan(self, targets: tuple[str, ...], seeds: dict) -> list[Stage]:
+        """The stages needed for `targets`, dependencies first."""
+        order: list[Stage] = []
+        visiting: set[str] = set()
+
+        def visit(name: str) -> None:
+            if name in seeds or any(s.name == name for s in order):
+                return
+            stage = self.stages.get(name)
+            if stage is None:
+                raise KeyError(f"No stage or seed named {name!r}")
+            if name in visiting:
+                raise ValueError(f"Stage cycle through {name!r}")
+            visiting.add(name)
+            for dep in stage.inputs:
+                visit(dep)
+            visiting.discard(name)
+            order.append(stage)
+
+        for target in targets:
+            visit(target)
+        return order
+
+    def _run_stage(self, stage: Stage, args: list):
+        with tracing.span(stage.name, "stage") as span:
+            if not stage.memo:
+                return stage.fn(*args)
+            key = content_key(stage.name, args)
+            value = self._memo.get(key)
+            span.attrs["cache"] = "miss" if value is None else "memory"
+            if value is None:
+                started = time.perf_counter()
+                value = stage.fn(*args)
+                self._memo.set(key, value, ttl=stage.ttl, cost=time.perf_counter() - started)
+            return value
@@ -0,0 +1,114 @@
+import json
+
+# ---------------------------------------------------------------------------
+# Incremental parser for the FundingForge JSON report
+# ---------------------------------------------------------------------------
+
+
+class IncrementalReportParser:
+    """
+    Consume the model's JSON report as it streams and surface each piece as
+    soon as it is complete: the `researcher_summary` string once its closing
+    quote arrives, and every `matches[i]` object once its closing brace does.
+
+    Only brace/quote structure is tracked and each character is scanned
+    once, so feeding a token costs time proportional to its length. Text
+    before the first top-level `{` (preamble, ``` fences) is ignored.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        """Discard everything seen so far (e.g. text from an earlier agent turn)."""
+        self._text = ""
+        self._pos = 0
+        self._stack: list[str] = []        # open containers: "{" or "["
+        self._expect_key: list[bool] = []  # per open object: next string is a key
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._string_is_key = False
+        self._top_key: str | None = None
+        self._match_start: int | None = None
+        self._match_count = 0
+        self._done = False
+
+    def feed(self, chunk: str) -> list[tuple]:
+        """
+        Add streamed text and return newly completed items as
+        ("researcher_summary", str) or ("match", index, dict) tuples.
+        """
+        events: list[tuple] = []
+        if self._done:
+            return events
+        self._text += chunk
+        text = self._text
+
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._close_string(text, i, events)
+                continue
+
+            if not self._stack and ch != "{":
+                continue  # outside the report
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+                self._string_is_key = self._stack[-1] == "{" and self._expect_key[-1]
+            elif ch in "{[":
+                if ch == "{" and self._in_matches_array():
+                    self._match_start = i
+                self._stack.append(ch)
+                self._expect_key.append(ch == "{")
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                self._expect_key.pop()
+                if ch == "}" and self._match_start is not None and self._in_matches_array():
+                    self._close_match(text, i, events)
+                if not self._stack:
+                    self._done = True
+                    self._pos = i + 1
+                    return events
+            elif ch == ":" and self._stack[-1] == "{":
+                self._expect_key[-1] = False
+            elif ch == "," and self._stack[-1] == "{":
+                self._expect_key[-1] = True
+        self._pos = len(text)
+        return events
+
+    # -- helpers -------------------------------------------------------------
+
+    def _in_matches_array(self) -> bool:
+        return self._stack == ["{", "["] and self._top_key == "matches"
+
+    def _close_string(self, text: str, end: int, events: list) -> None:
+        if len(self._stack) != 1:
+            return
+        try:
+            value = json.loads(text[self._string_start:end + 1])
+        except ValueError:
+            return
+        if self._string_is_key:
+            self._top_key = value
+        elif self._top_key == "researcher_summary":
+            events.append(("researcher_summary", value))
+
+    def _close_match(self, text: str, end: int, events: list) -> None:
+        try:
+            match = json.loads(text[self._match_start:end + 1])
+        except ValueError:
+            match = None
+        self._match_start = None
+        if isinstance(match, dict):
+            events.append(("match", self._match_count, match))
+            self._match_count += 1
@@ -0,0 +1,274 @@
+import os
+import json
+import math
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH")  # append every finished trace here as JSONL
+
+# Span attributes that are summed into a trace's totals
+_TOKEN_ATTRS = ("input_tokens", "output_tokens", "cache_read_tokens", "cache_write_tokens")
+
+
+# ---------------------------------------------------------------------------
+# Spans and traces
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Span:
+    name: str
+    kind: str                # "stage", "tool", "retrieve", "model", "parse"
+    start_s: float = 0.0     # offset from the start of the trace
+    duration_s: float = 0.0
+    attrs: dict = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "start_s": round(self.start_s, 4),
+            "duration_s": round(self.duration_s, 4),
+            **self.attrs,
+        }
+
+
+class Trace:
+    """Thread-safe list of timed spans for one FundingForge run."""
+
+    def __init__(self, name: str = "run", **attrs):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self.duration_s: float | None = None
+        self.spans: list[Span] = []
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, kind: str, **attrs):
+        """Time the enclosed block; the yielded Span's attrs can be filled in as it runs."""
+        started = time.perf_counter()
+        span = Span(name, kind, started - self._t0, attrs=attrs)
+        try:
+            yield span
+        except BaseException as e:
+            span.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            span.duration_s = time.perf_counter() - started
+            self._add(span)
+
+    def record(self, name: str, kind: str, started: float, **attrs) -> Span:
+        """Add a span that began at perf_counter() value `started` and ends now."""
+        span = Span(name, kind, started - self._t0, time.perf_counter() - started, attrs)
+        self._add(span)
+        return span
+
+    def _add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def finish(self) -> None:
+        if self.duration_s is None:
+            self.duration_s = time.perf_counter() - self._t0
+            _metrics.observe(self)
+            if TRACE_LOG_PATH:
+                export_jsonl(self, TRACE_LOG_PATH)
+
+    def totals(self) -> dict:
+        """
+        Per-kind span counts and durations, model calls per stage (with the
+        model id and tokens), token usage and retrieval cache hits.
+        """
+        with self._lock:
+            spans = list(self.spans)
+        kinds: dict[str, dict] = {}
+        models: dict[str, dict] = {}
+        tokens = dict.fromkeys(_TOKEN_ATTRS, 0)
+        cache = {"hits": 0, "misses": 0}
+        for span in spans:
+            agg = kinds.setdefault(span.kind, {"count": 0, "duration_s": 0.0})
+            agg["count"] += 1
+            agg["duration_s"] = round(agg["duration_s"] + span.duration_s, 4)
+            if span.kind == "model":
+                stage = models.setdefault(span.name, {
+                    "model_id": span.attrs.get("model_id"), "count": 0, "duration_s": 0.0,
+                    "input_tokens": 0, "output_tokens": 0, "cache_read_tokens": 0, "cache_write_tokens": 0,
+                })
+                stage["count"] += 1
+                stage["duration_s"] = round(stage["duration_s"] + span.duration_s, 4)
+                stage["input_tokens"] += span.attrs.get("input_tokens") or 0
+                stage["output_tokens"] += span.attrs.get("output_tokens") or 0
+                stage["cache_read_tokens"] += span.attrs.get("cache_read_tokens") or 0
+                stage["cache_write_tokens"] += span.attrs.get("cache_write_tokens") or 0
+            for key in _TOKEN_ATTRS:
+                tokens[key] += span.attrs.get(key) or 0
+            if "cache" in span.attrs:
+                cache["misses" if span.attrs["cache"] == "miss" else "hits"] += 1
+        return {"by_kind": kinds, "models": models, "tokens": tokens, "cache": cache}
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            spans = [s.as_dict() for s in sorted(self.spans, key=lambda s: s.start_s)]
+        return {
+            "trace_id": self.id,
+            "name": self.name,
+            **self.attrs,
+            "started_at": self.started_at,
+            "duration_s": round(self.duration_s, 4) if self.duration_s is not None else None,
+            "totals": self.totals(),
+            "spans": spans,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Current trace – carried in a ContextVar so tools and retrieval helpers can
+# add spans without threading a trace argument through every call
+# ---------------------------------------------------------------------------
+
+_current: ContextVar[Trace | None] = ContextVar("fundingforge_trace", default=None)
+
+
+def current_trace() -> Trace | None:
+    return _current.get()
+
+
+@contextmanager
+def start_trace(name: str = "run", **attrs):
+    """Make a new Trace current for the enclosed block and finish it on exit."""
+    trace = Trace(name, **attrs)
+    token = _current.set(trace)
+    try:
+        yield trace
+    except BaseException as e:
+        trace.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        trace.finish()
+
+
+@contextmanager
+def span(name: str, kind: str, **attrs):
+    """Span on the current trace; a detached, unrecorded Span when none is active."""
+    trace = _current.get()
+    if trace is None:
+        yield Span(name, kind, attrs=attrs)
+        return
+    with trace.span(name, kind, **attrs) as s:
+        yield s
+
+
+def bind(fn):
+    """Wrap `fn` so it runs in the caller's context (current trace, run state) on a pool thread."""
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        # A fresh copy per call: one Context cannot be entered by two threads at once
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+# ---------------------------------------------------------------------------
+# Exporters
+# ---------------------------------------------------------------------------
+
+_export_lock = threading.Lock()
+
+
+def export_jsonl(trace: Trace, path: str) -> None:
+    """Append one trace as a JSON line."""
+    line = json.dumps(trace.as_dict(), ensure_ascii=False) + "\n"
+    with _export_lock, open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, math.inf)
+
+
+class _Histogram:
+    def __init__(self):
+        self.counts = [0] * len(_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class _Metrics:
+    """Process-wide aggregates of every finished trace, for Prometheus scraping."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs: dict[tuple, _Histogram] = {}
+        self.spans: dict[tuple, _Histogram] = {}
+        self.tokens: dict[str, int] = dict.fromkeys(_TOKEN_ATTRS, 0)
+        self.cache: dict[tuple, int] = {}
+
+    def observe(self, trace: Trace) -> None:
+        with self._lock:
+            status = "error" if "error" in trace.attrs else "ok"
+            run_labels = (("name", trace.name), ("mode", str(trace.attrs.get("mode", ""))), ("status", status))
+            self.runs.setdefault(run_labels, _Histogram()).observe(trace.duration_s)
+            for s in list(trace.spans):
+                labels = (("kind", s.kind), ("name", s.name))
+                self.spans.setdefault(labels, _Histogram()).observe(s.duration_s)
+                for key in _TOKEN_ATTRS:
+                    self.tokens[key] += s.attrs.get(key) or 0
+                if "cache" in s.attrs:
+                    cache_labels = (("name", s.name), ("result", s.attrs["cache"]))
+                    self.cache[cache_labels] = self.cache.get(cache_labels, 0) + 1
+
+    def snapshot(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            _histogram_lines(lines, "fundingforge_run_duration_seconds",
+                             "End-to-end run_agent latency.", self.runs)
+            _histogram_lines(lines, "fundingforge_span_duration_seconds",
+                             "Latency of each tool call, retrieval, model turn and stage.", self.spans)
+            lines += ["# HELP fundingforge_tokens_total Model tokens by type.",
+                      "# TYPE fundingforge_tokens_total counter"]
+            lines += [f'fundingforge_tokens_total{{type="{k.removesuffix("_tokens")}"}} {v}'
+                      for k, v in self.tokens.items()]
+            lines += ["# HELP fundingforge_cache_lookups_total Cached lookups by span and outcome.",
+                      "# TYPE fundingforge_cache_lookups_total counter"]
+            lines += [f"fundingforge_cache_lookups_total{_labels(k)} {v}" for k, v in sorted(self.cache.items())]
+        return "\n".join(lines) + "\n"
+
+
+def _labels(pairs, **extra) -> str:
+    items = list(pairs) + list(extra.items())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+
+def _histogram_lines(lines: list[str], metric: str, help_text: str, series: dict) -> None:
+    lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+    for labels, hist in sorted(series.items()):
+        for bound, count in zip(_BUCKETS, hist.counts):
+            le = "+Inf" if bound == math.inf else repr(bound)
+            lines.append(f"{metric}_bucket{_labels(labels, le=le)} {count}")
+        lines.append(f"{metric}_sum{_labels(labels)} {hist.sum:.6f}")
+        lines.append(f"{metric}_count{_labels(labels)} {hist.count}")
+
+
+_metrics = _Metrics()
+
+
+def prometheus_snapshot() -> str:
+    """Prometheus text-format snapshot of all traces finished in this process."""
+    return _metrics.snapshot()